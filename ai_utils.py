@@ -1,13 +1,55 @@
 import os
 import json
-import openai
-from openai import OpenAI
+import time
+import hashlib
+from functools import lru_cache
 import pandas as pd
 import yfinance as yf
 
-# Initialize OpenAI client
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """Create the OpenAI client on first use and reuse it for later requests"""
+    # Imported lazily so pages importing this module don't pay for loading openai
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+# the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+OPENAI_MODEL = "gpt-4o"
+
+# On-disk cache for LLM responses so repeated requests skip the paid API call
+LLM_CACHE_DIR = os.path.join("data", "llm_cache")
+LLM_CACHE_TTL = 24 * 60 * 60  # seconds
+
+def make_llm_cache_key(*parts):
+    """Build a stable cache key from the parts that determine an LLM response"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def get_cached_llm_response(key, max_age=LLM_CACHE_TTL):
+    """Return a cached LLM response for the key, or None if missing or expired"""
+    cache_file = os.path.join(LLM_CACHE_DIR, f"{key}.json")
+    try:
+        if os.path.exists(cache_file) and time.time() - os.path.getmtime(cache_file) < max_age:
+            with open(cache_file, 'r') as f:
+                return json.load(f)
+    except Exception:
+        # A corrupt cache entry just means a fresh API call
+        pass
+    
+    return None
+
+def cache_llm_response(key, response):
+    """Store an LLM response in the on-disk cache"""
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        
+        with open(os.path.join(LLM_CACHE_DIR, f"{key}.json"), 'w') as f:
+            json.dump(response, f)
+    except Exception:
+        # Caching is best effort
+        pass
 
 def analyze_portfolio(holdings, user_preferences=None):
     """
@@ -29,6 +71,17 @@ def analyze_portfolio(holdings, user_preferences=None):
             "insights": []
         }
     
+    # Reuse a stored analysis when the holdings, prices and preferences are unchanged
+    cache_key = make_llm_cache_key(
+        'analyze_portfolio',
+        OPENAI_MODEL,
+        sorted(holdings, key=lambda holding: holding['ticker']),
+        user_preferences
+    )
+    cached_result = get_cached_llm_response(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
     # Get additional market data for context
     tickers = [holding['ticker'] for holding in holdings]
     try:
@@ -153,8 +206,8 @@ def analyze_portfolio(holdings, user_preferences=None):
     
     try:
         # Make API call to OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        response = get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
@@ -166,6 +219,7 @@ def analyze_portfolio(holdings, user_preferences=None):
         
         # Parse the response
         result = json.loads(response.choices[0].message.content)
+        cache_llm_response(cache_key, result)
         return result
     
     except Exception as e:
@@ -178,13 +232,14 @@ def analyze_portfolio(holdings, user_preferences=None):
             "insights": ["Please try again later or contact support if the issue persists."]
         }
 
-def screen_stocks(query, max_results=5):
+def screen_stocks(query, max_results=5, client=None):
     """
     Use OpenAI to interpret a natural language query and return stock recommendations
     
     Parameters:
     - query: Natural language query describing the desired stock characteristics
     - max_results: Maximum number of results to return
+    - client: Optional OpenAI client to use instead of the shared one from get_openai_client
     
     Returns:
     - Dictionary containing screened stocks and interpretation
@@ -230,8 +285,9 @@ def screen_stocks(query, max_results=5):
         """
         
         # Call the OpenAI API
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        client = client or get_openai_client()
+        response = client.chat.completions.create(
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": query}
@@ -315,8 +371,8 @@ def analyze_news_sentiment(news_items):
     
     try:
         # Call the OpenAI API
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        response = get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"Analyze the sentiment of these headlines:\n{headlines_text}"}
@@ -429,8 +485,8 @@ def generate_market_sentiment_analysis(tickers):
     
     try:
         # Make API call to OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        response = get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
@@ -5,8 +5,9 @@ import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
 import numpy as np
-from utils import calculate_moving_averages, calculate_rsi, calculate_bollinger_bands, calculate_macd
+from utils import calculate_all_indicators
 import database as db
+from market_data import get_quote
 from gamification import initialize_gamification, track_stock_analysis, track_favorite_added
 from monetization import get_user_plan, PREMIUM_PLANS
 import theme_manager
@@ -31,50 +32,24 @@ if 'triggered_alerts' not in st.session_state:
 
 # Function to check price alerts
 def check_price_alerts_background():
-    # Get all pending alerts
-    pending_alerts = db.get_pending_alerts()
+    # Get unique tickers with pending alerts
+    tickers = db.get_pending_alert_tickers()
     
-    if not pending_alerts:
+    if not tickers:
         return []
     
-    # Get unique tickers to check
-    tickers = set([alert['ticker'] for alert in pending_alerts])
-    
     # Fetch current prices
     current_prices = {}
-    triggered_alerts = []
     
     for ticker in tickers:
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-            current_prices[ticker] = current_price
+            current_prices[ticker] = get_quote(ticker)['price'] or 0
         except Exception as e:
             # Skip this ticker on error
             continue
     
-    # Check each alert against current price
-    for alert in pending_alerts:
-        ticker = alert['ticker']
-        if ticker not in current_prices:
-            continue
-            
-        current_price = current_prices[ticker]
-        target_price = alert['target_price']
-        is_above = alert['is_above'] == 1
-        
-        # Check if the alert is triggered
-        if (is_above and current_price >= target_price) or (not is_above and current_price <= target_price):
-            # Mark as triggered in the database
-            db.mark_alert_triggered(alert['id'])
-            
-            # Add to triggered list
-            alert_dict = dict(alert)
-            alert_dict['current_price'] = current_price
-            triggered_alerts.append(alert_dict)
-    
-    return triggered_alerts
+    # Check every pending alert against the prices and mark the triggered ones in one transaction
+    return db.trigger_alerts_at_prices(current_prices)
 
 # Check for triggered alerts (every 10 minutes max)
 current_time = datetime.now()
@@ -505,18 +480,19 @@ try:
                 name='OHLC'
             ))
             
+            # Calculate all technical indicators in one pass when any of them is selected
+            indicator_data = calculate_all_indicators(hist_data) if (show_ma or show_bollinger or show_rsi or show_macd) else None
+            
             # Add technical indicators if selected
             if show_ma:
-                ma_data = calculate_moving_averages(hist_data)
-                fig.add_trace(go.Scatter(x=ma_data.index, y=ma_data['MA20'], mode='lines', name='20-Day MA', line=dict(color='blue')))
-                fig.add_trace(go.Scatter(x=ma_data.index, y=ma_data['MA50'], mode='lines', name='50-Day MA', line=dict(color='orange')))
-                fig.add_trace(go.Scatter(x=ma_data.index, y=ma_data['MA200'], mode='lines', name='200-Day MA', line=dict(color='red')))
+                fig.add_trace(go.Scatter(x=indicator_data.index, y=indicator_data['MA20'], mode='lines', name='20-Day MA', line=dict(color='blue')))
+                fig.add_trace(go.Scatter(x=indicator_data.index, y=indicator_data['MA50'], mode='lines', name='50-Day MA', line=dict(color='orange')))
+                fig.add_trace(go.Scatter(x=indicator_data.index, y=indicator_data['MA200'], mode='lines', name='200-Day MA', line=dict(color='red')))
             
             if show_bollinger:
-                bb_data = calculate_bollinger_bands(hist_data)
-                fig.add_trace(go.Scatter(x=bb_data.index, y=bb_data['upper_band'], mode='lines', name='Upper BB', line=dict(color='gray', width=1)))
-                fig.add_trace(go.Scatter(x=bb_data.index, y=bb_data['lower_band'], mode='lines', name='Lower BB', line=dict(color='gray', width=1)))
-                fig.add_trace(go.Scatter(x=bb_data.index, y=bb_data['middle_band'], mode='lines', name='Middle BB', line=dict(color='purple', width=1)))
+                fig.add_trace(go.Scatter(x=indicator_data.index, y=indicator_data['upper_band'], mode='lines', name='Upper BB', line=dict(color='gray', width=1)))
+                fig.add_trace(go.Scatter(x=indicator_data.index, y=indicator_data['lower_band'], mode='lines', name='Lower BB', line=dict(color='gray', width=1)))
+                fig.add_trace(go.Scatter(x=indicator_data.index, y=indicator_data['middle_band'], mode='lines', name='Middle BB', line=dict(color='purple', width=1)))
             
             # Update layout
             fig.update_layout(
@@ -532,9 +508,7 @@ try:
             
             # RSI chart (if selected)
             if show_rsi:
-                rsi_data = calculate_rsi(hist_data)
-                
-                fig_rsi = px.line(rsi_data, x=rsi_data.index, y='RSI', title='Relative Strength Index (RSI)')
+                fig_rsi = px.line(indicator_data, x=indicator_data.index, y='RSI', title='Relative Strength Index (RSI)')
                 
                 # Add RSI reference lines
                 fig_rsi.add_hline(y=70, line_dash="dash", line_color="red", annotation_text="Overbought (70)")
@@ -551,15 +525,13 @@ try:
                 
             # MACD chart (if selected)
             if show_macd:
-                macd_data = calculate_macd(hist_data)
-                
                 # Create MACD plot
                 fig_macd = go.Figure()
                 
                 # Add MACD line
                 fig_macd.add_trace(go.Scatter(
-                    x=macd_data.index, 
-                    y=macd_data['macd'],
+                    x=indicator_data.index, 
+                    y=indicator_data['macd'],
                     mode='lines',
                     name='MACD',
                     line=dict(color='blue', width=1.5)
@@ -567,18 +539,18 @@ try:
                 
                 # Add signal line
                 fig_macd.add_trace(go.Scatter(
-                    x=macd_data.index, 
-                    y=macd_data['signal'],
+                    x=indicator_data.index, 
+                    y=indicator_data['signal'],
                     mode='lines',
                     name='Signal',
                     line=dict(color='red', width=1.5)
                 ))
                 
                 # Add histogram as a bar chart
-                colors = ['green' if val >= 0 else 'red' for val in macd_data['histogram']]
+                colors = ['green' if val >= 0 else 'red' for val in indicator_data['histogram']]
                 fig_macd.add_trace(go.Bar(
-                    x=macd_data.index,
-                    y=macd_data['histogram'],
+                    x=indicator_data.index,
+                    y=indicator_data['histogram'],
                     name='Histogram',
                     marker_color=colors
                 ))
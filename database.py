@@ -12,6 +12,8 @@ def get_db_connection():
     """Create a connection to the SQLite database"""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    # With WAL (enabled in init_db), NORMAL skips the fsync on every commit
+    conn.execute('PRAGMA synchronous=NORMAL')
     return conn
 
 def init_db():
@@ -19,6 +21,10 @@ def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # Write-ahead logging is stored in the database file, so this only needs to run once;
+    # readers no longer block on writers and commits append to the log
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Create favorite_stocks table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS favorite_stocks (
@@ -94,6 +100,12 @@ def init_db():
     )
     ''')
     
+    # Index for the triggered alert history (filtered on is_triggered, newest first)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_price_alerts_triggered
+    ON price_alerts (is_triggered, date_triggered DESC)
+    ''')
+    
     # Insert default preferences if table is empty
     cursor.execute('SELECT COUNT(*) FROM user_preferences')
     if cursor.fetchone()[0] == 0:
@@ -308,6 +320,29 @@ def update_portfolio_holding(holding_id, shares, purchase_price=None, purchase_d
         conn.close()
     return success
 
+def update_holding_sectors(sectors_by_id):
+    """
+    Store sectors for several holdings in one transaction
+    
+    Parameters:
+    - sectors_by_id: Dictionary mapping holding id to sector name
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.executemany(
+            'UPDATE portfolio_holdings SET sector = ? WHERE id = ?',
+            [(sector, holding_id) for holding_id, sector in sectors_by_id.items()]
+        )
+        conn.commit()
+        success = True
+    except Exception as e:
+        success = False
+    finally:
+        conn.close()
+    return success
+
 def remove_portfolio_holding(holding_id):
     """Remove a stock from portfolio"""
     conn = get_db_connection()
@@ -325,7 +360,7 @@ def get_portfolio_holdings(include_watchlist=True, sector=None, filter_type=None
     Parameters:
     - include_watchlist: Whether to include watchlist items (default: True)
     - sector: Filter by sector (default: None for all sectors)
-    - filter_type: 'active', 'sold', 'gainers', 'losers', or None for all holdings
+    - filter_type: 'active', 'sold', 'watchlist', 'gainers', 'losers', or None for all holdings
     """
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -342,11 +377,13 @@ def get_portfolio_holdings(include_watchlist=True, sector=None, filter_type=None
         query += ' AND sector = ?'
         params.append(sector)
     
-    # Type filter
+    # Type filter (active and sold positions never include watchlist items)
     if filter_type == 'active':
-        query += ' AND (sell_price IS NULL OR sell_price = 0)'
+        query += ' AND is_watchlist = 0 AND (sell_price IS NULL OR sell_price = 0)'
     elif filter_type == 'sold':
-        query += ' AND sell_price IS NOT NULL AND sell_price > 0'
+        query += ' AND is_watchlist = 0 AND sell_price IS NOT NULL AND sell_price > 0'
+    elif filter_type == 'watchlist':
+        query += ' AND is_watchlist = 1'
     
     # We can't apply gainers/losers filter here since we need current prices
     # This will be handled after retrieving the data
@@ -358,6 +395,22 @@ def get_portfolio_holdings(include_watchlist=True, sector=None, filter_type=None
     conn.close()
     return holdings
 
+def get_advisor_bootstrap():
+    """
+    Get all portfolio holdings (including watchlist) and the user preferences in one connection
+    
+    Returns:
+    - Tuple of (list of holding dicts ordered by ticker, preferences dict)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM portfolio_holdings ORDER BY ticker')
+    holdings = [dict(row) for row in cursor.fetchall()]
+    cursor.execute('SELECT * FROM user_preferences WHERE id = 1')
+    preferences = dict(cursor.fetchone())
+    conn.close()
+    return holdings, preferences
+
 def get_portfolio_holding(holding_id):
     """Get a specific portfolio holding"""
     conn = get_db_connection()
@@ -448,6 +501,29 @@ def get_price_alerts(ticker=None, active_only=True):
     conn.close()
     return alerts
 
+def get_triggered_alerts(limit=200):
+    """
+    Get triggered price alerts, most recently triggered first
+    
+    Parameters:
+    - limit: Maximum number of alerts to return
+    
+    Returns:
+    - List of price alert dictionaries
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT * FROM price_alerts 
+           WHERE is_triggered = 1
+           ORDER BY date_triggered DESC
+           LIMIT ?''',
+        (limit,)
+    )
+    alerts = cursor.fetchall()
+    conn.close()
+    return alerts
+
 def update_price_alert(alert_id, target_price=None, is_above=None, is_active=None):
     """
     Update a price alert
@@ -532,53 +608,75 @@ def delete_all_triggered_alerts():
         conn.close()
     return deleted_count
 
-def mark_alert_triggered(alert_id, notification_sent=1):
+def get_pending_alert_tickers():
     """
-    Mark a price alert as triggered
+    Get the distinct tickers that have active, non-triggered alerts
+    
+    Returns:
+    - List of ticker symbols
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        '''SELECT DISTINCT ticker FROM price_alerts 
+           WHERE is_active = 1 AND is_triggered = 0
+           ORDER BY ticker'''
+    )
+    tickers = [row['ticker'] for row in cursor.fetchall()]
+    conn.close()
+    return tickers
+
+def trigger_alerts_at_prices(prices, notification_sent=1):
+    """
+    Mark every pending alert whose target is crossed by the given prices as triggered
+    
+    The comparison runs in SQL against a temporary price table, and all matching
+    alerts are updated in the same transaction.
     
     Parameters:
-    - alert_id: ID of the alert to mark
+    - prices: Dictionary mapping ticker to current price
     - notification_sent: Whether notification was sent
     
     Returns:
-    - True if updated successfully, False otherwise
+    - List of triggered alert dictionaries, each with a 'current_price' key
     """
+    if not prices:
+        return []
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS current_prices (ticker TEXT PRIMARY KEY, price REAL)')
+        cursor.execute('DELETE FROM current_prices')
+        cursor.executemany('INSERT INTO current_prices (ticker, price) VALUES (?, ?)', list(prices.items()))
+        
         cursor.execute(
-            '''UPDATE price_alerts 
-               SET is_triggered = 1, 
-                   notification_sent = ?,
-                   date_triggered = CURRENT_TIMESTAMP
-               WHERE id = ?''',
-            (notification_sent, alert_id)
+            '''SELECT a.*, c.price AS current_price
+               FROM price_alerts a JOIN current_prices c ON a.ticker = c.ticker
+               WHERE a.is_active = 1 AND a.is_triggered = 0
+                 AND ((a.is_above = 1 AND c.price >= a.target_price)
+                      OR (a.is_above = 0 AND c.price <= a.target_price))
+               ORDER BY a.ticker, a.target_price'''
         )
+        triggered = [dict(row) for row in cursor.fetchall()]
+        
+        if triggered:
+            ids = [alert['id'] for alert in triggered]
+            cursor.execute(
+                f'''UPDATE price_alerts 
+                   SET is_triggered = 1, 
+                       notification_sent = ?,
+                       date_triggered = CURRENT_TIMESTAMP
+                   WHERE id IN ({', '.join('?' * len(ids))})''',
+                (notification_sent, *ids)
+            )
         conn.commit()
-        success = cursor.rowcount > 0
     except Exception as e:
-        success = False
+        conn.rollback()
+        triggered = []
     finally:
         conn.close()
-    return success
-
-def get_pending_alerts():
-    """
-    Get active, non-triggered alerts that need to be checked
-    
-    Returns:
-    - List of alert dictionaries
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''SELECT * FROM price_alerts 
-           WHERE is_active = 1 AND is_triggered = 0
-           ORDER BY ticker, target_price'''
-    )
-    alerts = cursor.fetchall()
-    conn.close()
-    return alerts
+    return triggered
 
 # Achievements and gamification functions
 def init_gamification_tables():
@@ -0,0 +1,60 @@
+import pandas as pd
+import streamlit as st
+import yfinance as yf
+
+# Yahoo Finance caps the number of symbols per multi-ticker request
+PRICE_BATCH_SIZE = 10
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_current_prices(tickers):
+    """
+    Fetch the latest price for a list of tickers using batched yfinance downloads
+    
+    Parameters:
+    - tickers: List of stock tickers
+    
+    Returns:
+    - Dictionary mapping each ticker to its latest price (tickers without data are omitted)
+    """
+    current_prices = {}
+    
+    for start in range(0, len(tickers), PRICE_BATCH_SIZE):
+        batch = tickers[start:start + PRICE_BATCH_SIZE]
+        try:
+            data = yf.download(batch, period='1d', progress=False, threads=True)
+        except Exception as e:
+            # Report the failed batch and carry on with the rest
+            st.warning(f"Could not fetch prices for {', '.join(batch)}: {e}")
+            continue
+        
+        if data.empty:
+            continue
+        
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(name=batch[0])
+        current_prices.update(closes.iloc[-1].dropna().to_dict())
+    
+    return current_prices
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_quote(ticker):
+    """
+    Get a small quote summary for a single ticker, shared by every page that shows one
+    
+    Parameters:
+    - ticker: Stock ticker
+    
+    Returns:
+    - Dictionary with price, name, long_name, sector, industry and change_pct
+      (missing values are None)
+    """
+    info = yf.Ticker(ticker).info
+    return {
+        'price': info.get('currentPrice', info.get('regularMarketPrice')),
+        'name': info.get('shortName', ticker),
+        'long_name': info.get('longName'),
+        'sector': info.get('sector'),
+        'industry': info.get('industry'),
+        'change_pct': info.get('regularMarketChangePercent')
+    }
@@ -1,4 +1,5 @@
 import streamlit as st
+from collections import Counter
 from datetime import datetime, timedelta
 import json
 import os
@@ -63,6 +64,11 @@ PREMIUM_PLANS = {
     }
 }
 
+# Parse each plan's hex color into an RGB tuple once, for the translucent rgba() card backgrounds
+for plan in PREMIUM_PLANS.values():
+    color = plan['color']
+    plan['rgb'] = (int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16))
+
 # Define premium features and which plans they belong to
 PREMIUM_FEATURES = {
     "unlimited_portfolio": {
@@ -165,11 +171,7 @@ def get_user_plan():
         # Start a trial
         start_trial('pro')
         # Clear the trial parameter to avoid reactivating on refresh
-        cleaned_params = dict(query_params)
-        if 'trial' in cleaned_params:
-            del cleaned_params['trial']
-        # Set the cleaned parameters
-        st.query_params.update(cleaned_params)
+        st.query_params.pop('trial', None)
         st.session_state.user_plan = 'pro'
         return 'pro'
     
@@ -302,11 +304,10 @@ def display_subscription_plans():
     st.header("📈 Upgrade Your Investment Journey")
     st.write("Choose the plan that's right for you")
     
-    plans = list(PREMIUM_PLANS.values())
-    cols = st.columns(len(plans))
+    cols = st.columns(len(PREMIUM_PLANS))
     
-    # Display plan cards
-    for i, plan in enumerate(plans):
+    # Display plan cards (the dict keys are the plan ids)
+    for i, (plan_id, plan) in enumerate(PREMIUM_PLANS.items()):
         with cols[i]:
             st.markdown(f"""
             <div style="
@@ -314,7 +315,7 @@ def display_subscription_plans():
                 border-radius: 10px; 
                 padding: 10px; 
                 height: 100%;
-                background-color: rgba({int(plan['color'][1:3], 16)}, {int(plan['color'][3:5], 16)}, {int(plan['color'][5:7], 16)}, 0.1);
+                background-color: rgba({plan['rgb'][0]}, {plan['rgb'][1]}, {plan['rgb'][2]}, 0.1);
             ">
                 <h3 style="color: {plan['color']}; text-align: center;">{plan['name']}</h3>
                 <h2 style="text-align: center;">{plan['price']}</h2>
@@ -328,8 +329,7 @@ def display_subscription_plans():
             
             st.markdown("</ul></div>", unsafe_allow_html=True)
             
-            if plan['name'] != "Free":
-                plan_id = plan['name'].lower()
+            if plan_id != "free":
                 if st.button(f"Choose {plan['name']}", key=f"choose_{plan_id}"):
                     # Store the plan choice in session state
                     set_test_plan(plan_id)
@@ -402,10 +402,7 @@ def track_feature_impression(feature_id):
     impression_data = load_impression_data()
     
     # Increment the impression count for this feature
-    if feature_id in impression_data:
-        impression_data[feature_id] += 1
-    else:
-        impression_data[feature_id] = 1
+    impression_data[feature_id] += 1
     
     # Save the updated data
     save_impression_data(impression_data)
@@ -415,10 +412,7 @@ def track_feature_click(feature_id):
     click_data = load_click_data()
     
     # Increment the click count for this feature
-    if feature_id in click_data:
-        click_data[feature_id] += 1
-    else:
-        click_data[feature_id] = 1
+    click_data[feature_id] += 1
     
     # Save the updated data
     save_click_data(click_data)
@@ -428,11 +422,11 @@ def load_impression_data():
     try:
         if os.path.exists(IMPRESSIONS_FILE):
             with open(IMPRESSIONS_FILE, 'r') as f:
-                return json.load(f)
+                return Counter(json.load(f))
     except Exception as e:
         st.error(f"Error loading impression data: {e}")
     
-    return {}
+    return Counter()
 
 def save_impression_data(data):
     """Save feature impression data to file"""
@@ -450,11 +444,11 @@ def load_click_data():
     try:
         if os.path.exists(CLICKS_FILE):
             with open(CLICKS_FILE, 'r') as f:
-                return json.load(f)
+                return Counter(json.load(f))
     except Exception as e:
         st.error(f"Error loading click data: {e}")
     
-    return {}
+    return Counter()
 
 def save_click_data(data):
     """Save feature click data to file"""
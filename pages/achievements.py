@@ -9,6 +9,7 @@ import os
 # Import local modules
 from database import get_user_stats, get_achievements
 from gamification import (
+    ACHIEVEMENTS,
     display_achievements_section, 
     display_leaderboard,
     initialize_user_stats,
@@ -23,6 +24,18 @@ st.set_page_config(
     layout="wide"
 )
 
+# Total number of badges that can be earned
+MAX_ACHIEVEMENTS = len(ACHIEVEMENTS)
+
+# Tips for earning more achievements
+ACHIEVEMENT_TIPS = (
+    "💰 Add stocks with high dividend yields to earn the Dividend Hunter badge",
+    "🔍 Use the AI Stock Screener to discover new investment opportunities",
+    "📊 Check sentiment for different stocks to track market opinions",
+    "🌎 Add stocks from different countries to earn the Globetrotter badge",
+    "📱 Visit the app for 3 consecutive days to earn the Market Regular badge"
+)
+
 def main():
     st.title("🏆 Investment Journey Achievements")
     
@@ -54,10 +67,10 @@ def main():
             
         with col3:
             achievements_count = len(stats.get('achievements', []))
-            st.metric("Achievements Unlocked", f"{achievements_count}/15")
+            st.metric("Achievements Unlocked", f"{achievements_count}/{MAX_ACHIEVEMENTS}")
         
         # Progress bar
-        progress = min(1.0, achievements_count / 15)
+        progress = min(1.0, achievements_count / MAX_ACHIEVEMENTS)
         st.progress(progress)
         
         # Achievement badges
@@ -99,15 +112,7 @@ def main():
         
         # Tips for earning more achievements
         st.subheader("Tips for Earning More Achievements")
-        tips = [
-            "💰 Add stocks with high dividend yields to earn the Dividend Hunter badge",
-            "🔍 Use the AI Stock Screener to discover new investment opportunities",
-            "📊 Check sentiment for different stocks to track market opinions",
-            "🌎 Add stocks from different countries to earn the Globetrotter badge",
-            "📱 Visit the app for 3 consecutive days to earn the Market Regular badge"
-        ]
-        
-        for tip in tips:
+        for tip in ACHIEVEMENT_TIPS:
             st.markdown(f"- {tip}")
     
     with tab2:
@@ -2,11 +2,13 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import database as db
-import yfinance as yf
 from ai_utils import analyze_portfolio, generate_market_sentiment_analysis
 from monetization import is_feature_available, display_feature_teaser
 from gamification import track_ai_screener_use
+from market_data import fetch_current_prices
 
 # Set page config
 st.set_page_config(
@@ -33,6 +35,55 @@ if 'has_advanced_ai' not in st.session_state:
 if 'has_premium_sentiment' not in st.session_state:
     st.session_state.has_premium_sentiment = is_feature_available('premium_market_sentiment')
 
+# How long priced portfolio data is reused across reruns (seconds)
+PORTFOLIO_CACHE_TTL = 60
+
+# Tickers per sentiment request; batches are analyzed concurrently
+SENTIMENT_BATCH_SIZE = 5
+
+@st.cache_data(ttl=900, show_spinner=False)
+def get_market_sentiment(tickers):
+    """
+    Generate market sentiment for a sorted tuple of tickers, cached for 15 minutes
+    
+    Tickers are split into batches that are analyzed concurrently and merged
+    into a single result.
+    """
+    batches = [list(tickers[start:start + SENTIMENT_BATCH_SIZE]) for start in range(0, len(tickers), SENTIMENT_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return generate_market_sentiment_analysis(list(tickers))
+    
+    with ThreadPoolExecutor(max_workers=min(4, len(batches))) as executor:
+        results = list(executor.map(generate_market_sentiment_analysis, batches))
+    
+    # Surface the first failure so the caller can handle it like a single request
+    for result in results:
+        if result['overall_market'].startswith("There was an error"):
+            return result
+    
+    # Merge the per-stock results and summarize the combined sentiment
+    stocks = {}
+    for result in results:
+        stocks.update(result.get('stocks', {}))
+    
+    sentiment_counts = Counter(
+        analysis.get('sentiment', 'unknown').lower() for analysis in stocks.values() if isinstance(analysis, dict)
+    )
+    tally = ", ".join(f"{count} {sentiment}" for sentiment, count in sentiment_counts.most_common())
+    summaries = "\n\n".join(result['overall_market'] for result in results)
+    
+    return {
+        "overall_market": f"Across {len(stocks)} stocks: {tally}.\n\n{summaries}",
+        "stocks": stocks
+    }
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_advisor_data():
+    """Load holdings and preferences in one database trip, cached for 30 seconds"""
+    return db.get_advisor_bootstrap()
+
+all_holdings, user_preferences = get_advisor_data()
+
 # Create tabs for different AI services
 tabs = st.tabs(["Portfolio Recommendations", "Market Sentiment", "User Preferences"])
 
@@ -41,47 +92,64 @@ with tabs[0]:
     st.subheader("AI-Powered Portfolio Recommendations")
     st.markdown("Our AI analyzes your portfolio holdings to provide personalized recommendations tailored to your investment goals and preferences.")
     
-    # Get portfolio data
-    holdings = db.get_portfolio_holdings(include_watchlist=False)
+    # Let the user force a fresh price fetch
+    if st.button("🔄 Refresh prices", key="refresh_prices"):
+        st.session_state.pop('portfolio_cache', None)
+        fetch_current_prices.clear()
+    
+    # Get portfolio data (watchlist items excluded)
+    holdings = [holding for holding in all_holdings if not holding['is_watchlist']]
     
     if len(holdings) == 0:
         st.warning("⚠️ Your portfolio is empty. Please add some holdings in the Portfolio Tracker to receive personalized recommendations.")
         recommendation_disabled = True
     else:
-        # Process the portfolio data
-        portfolio_data = []
-        total_value = 0
-        total_cost = 0
-        
-        # Process each holding with current price data
-        for holding in holdings:
-            ticker = holding['ticker']
-            shares = holding['shares']
-            purchase_price = holding['purchase_price'] if holding['purchase_price'] else 0
+        # Reuse the priced holdings on unrelated reruns. Prices are only re-fetched when
+        # the holdings change, the user refreshes, or recommendations are requested
+        # with prices older than PORTFOLIO_CACHE_TTL
+        holdings_snapshot = [dict(holding) for holding in holdings]
+        portfolio_cache = st.session_state.get('portfolio_cache')
+        generate_requested = st.session_state.get('gen_recommendations', False)
+        if (portfolio_cache
+                and portfolio_cache['holdings'] == holdings_snapshot
+                and not (generate_requested and time.time() - portfolio_cache['time'] >= PORTFOLIO_CACHE_TTL)):
+            portfolio_data = portfolio_cache['data']
+        else:
+            # Process the portfolio data
+            portfolio_data = []
             
-            # Fetch current price data from yfinance
-            try:
-                ticker_data = yf.Ticker(ticker)
-                info = ticker_data.info
-                current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
+            # Fetch current prices for all holdings in batched requests
+            current_prices = fetch_current_prices(sorted({holding['ticker'] for holding in holdings}))
+            
+            # Process each holding with current price data
+            for holding in holdings_snapshot:
+                ticker = holding['ticker']
+                shares = holding['shares']
+                
+                if ticker not in current_prices:
+                    st.error(f"Error fetching data for {ticker}: no price data returned")
+                    continue
+                current_price = current_prices[ticker]
                 
                 # Add current price to holding
-                holding_with_price = holding.copy()
+                holding_with_price = dict(holding)
                 holding_with_price['current_price'] = current_price
                 holding_with_price['value'] = current_price * shares
                 portfolio_data.append(holding_with_price)
-                
-                # Calculate totals
-                total_value += current_price * shares
-                total_cost += purchase_price * shares
-            except Exception as e:
-                st.error(f"Error fetching data for {ticker}: {str(e)}")
+            
+            st.session_state.portfolio_cache = {
+                'holdings': holdings_snapshot,
+                'data': portfolio_data,
+                'time': time.time()
+            }
         
         # Create DataFrame from processed data
         portfolio_df = pd.DataFrame(portfolio_data)
         
-        # Calculate average return
+        # Calculate totals and average return
         if 'purchase_price' in portfolio_df.columns and 'current_price' in portfolio_df.columns:
+            portfolio_df['cost'] = portfolio_df['purchase_price'].fillna(0) * portfolio_df['shares']
+            total_value, total_cost = portfolio_df[['value', 'cost']].sum()
             portfolio_df['gain_loss_pct'] = ((portfolio_df['current_price'] - portfolio_df['purchase_price']) / portfolio_df['purchase_price']) * 100
             avg_return = portfolio_df['gain_loss_pct'].mean() if not portfolio_df['gain_loss_pct'].empty else 0
             
@@ -93,6 +161,9 @@ with tabs[0]:
                 st.metric("Portfolio Value", f"${total_value:,.2f}")
             with col3:
                 st.metric("Average Return", f"{avg_return:.2f}%", delta=f"{avg_return:.2f}%")
+            
+            price_time = time.strftime('%H:%M:%S', time.localtime(st.session_state.portfolio_cache['time']))
+            st.caption(f"Prices as of {price_time}")
         
         recommendation_disabled = False
     
@@ -101,9 +172,6 @@ with tabs[0]:
     with col1:
         if st.button("Generate Recommendations", key="gen_recommendations", disabled=recommendation_disabled):
             with st.spinner("Analyzing your portfolio and generating recommendations..."):
-                # Get user preferences
-                user_preferences = db.get_user_preferences()
-                
                 # Track usage for gamification
                 track_ai_screener_use()
                 
@@ -158,17 +226,20 @@ with tabs[0]:
             rec_df = pd.DataFrame(recommendations['recommendations'])
             
             # Create styled table with color-coded recommendation types
-            def highlight_recommendation_type(val):
-                color_map = {
-                    'buy': 'background-color: #d4f1d4',    # Light green
-                    'sell': 'background-color: #ffd4d4',   # Light red
-                    'hold': 'background-color: #e6f3ff',   # Light blue
-                    'watch': 'background-color: #fff2cc'   # Light yellow
-                }
-                return color_map.get(val.lower(), '')
+            color_map = {
+                'buy': 'background-color: #d4f1d4',    # Light green
+                'sell': 'background-color: #ffd4d4',   # Light red
+                'hold': 'background-color: #e6f3ff',   # Light blue
+                'watch': 'background-color: #fff2cc'   # Light yellow
+            }
+            
+            # Build the whole style frame at once instead of a per-cell callback
+            rec_styles = pd.DataFrame('', index=rec_df.index, columns=rec_df.columns)
+            if 'type' in rec_df.columns:
+                rec_styles['type'] = rec_df['type'].astype(str).str.lower().map(color_map).fillna('')
             
             # Apply styles and display
-            styled_rec = rec_df.style.applymap(highlight_recommendation_type, subset=['type'])
+            styled_rec = rec_df.style.apply(lambda _: rec_styles, axis=None)
             st.dataframe(styled_rec, use_container_width=True)
         else:
             st.info("No specific stock recommendations at this time.")
@@ -196,15 +267,17 @@ with tabs[1]:
     st.markdown("Get AI-powered sentiment analysis for stocks in your portfolio and watchlist.")
     
     # Get all tickers from portfolio and watchlist
-    portfolio_stocks = db.get_portfolio_holdings(include_watchlist=True)
-    all_tickers = list(set([stock['ticker'] for stock in portfolio_stocks]))
+    portfolio_stocks = all_holdings
+    ticker_set = frozenset(stock['ticker'] for stock in portfolio_stocks)
     
     # Let user add additional tickers
     with st.expander("Add tickers for sentiment analysis"):
         additional_tickers = st.text_input("Enter additional ticker symbols (separated by commas)", "")
         if additional_tickers:
-            new_tickers = [ticker.strip().upper() for ticker in additional_tickers.split(',')]
-            all_tickers = list(set(all_tickers + new_tickers))
+            ticker_set |= frozenset(ticker.strip().upper() for ticker in additional_tickers.split(',') if ticker.strip())
+    
+    # Sorted once - used for display and as the sentiment cache key
+    all_tickers = tuple(sorted(ticker_set))
     
     # Display the list of tickers that will be analyzed
     st.markdown(f"**Analyzing {len(all_tickers)} stocks:** {', '.join(all_tickers)}" if all_tickers else "No stocks selected for analysis.")
@@ -220,8 +293,11 @@ with tabs[1]:
                 # Track sentiment analysis for gamification
                 track_ai_screener_use()
                 
-                # Generate market sentiment analysis
-                sentiment = generate_market_sentiment_analysis(all_tickers)
+                # Generate market sentiment analysis (repeat requests for the same tickers are cached)
+                sentiment = get_market_sentiment(all_tickers)
+                if sentiment['overall_market'].startswith("There was an error"):
+                    # Don't keep failed analyses around
+                    get_market_sentiment.clear()
                 st.session_state.sentiment_analysis = sentiment
                 st.session_state.last_sentiment_time = time.time()
     
@@ -255,19 +331,17 @@ with tabs[1]:
         if sentiment_data:
             sent_df = pd.DataFrame(sentiment_data)
             
-            # Create a function to highlight sentiment
-            def highlight_sentiment(val):
-                if val.lower() == 'bullish':
-                    return 'background-color: #d4f1d4'
-                elif val.lower() == 'bearish':
-                    return 'background-color: #ffd4d4'
-                elif val.lower() == 'neutral':
-                    return 'background-color: #f0f0f0'
-                else:
-                    return ''
+            # Highlight sentiment with a vectorized lookup
+            sentiment_colors = {
+                'bullish': 'background-color: #d4f1d4',
+                'bearish': 'background-color: #ffd4d4',
+                'neutral': 'background-color: #f0f0f0'
+            }
+            sent_styles = pd.DataFrame('', index=sent_df.index, columns=sent_df.columns)
+            sent_styles['Sentiment'] = sent_df['Sentiment'].str.lower().map(sentiment_colors).fillna('')
             
             # Apply styles and display
-            styled_sent = sent_df.style.applymap(highlight_sentiment, subset=['Sentiment'])
+            styled_sent = sent_df.style.apply(lambda _: sent_styles, axis=None)
             st.dataframe(styled_sent, use_container_width=True)
         
         # Display premium teaser for market sentiment if not available
@@ -288,7 +362,7 @@ with tabs[2]:
     st.markdown("Set your investment preferences to receive more personalized AI recommendations.")
     
     # Get current preferences
-    current_prefs = db.get_user_preferences()
+    current_prefs = user_preferences
     
     # Risk profile
     risk_profile = st.select_slider(
@@ -345,4 +419,5 @@ with tabs[2]:
         
         # Update in database
         db.update_user_preferences(new_preferences)
+        get_advisor_data.clear()
         st.success("Your investment preferences have been saved! The AI will use these to generate more personalized recommendations.")
\ No newline at end of file
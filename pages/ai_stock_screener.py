@@ -2,20 +2,12 @@ import streamlit as st
 import yfinance as yf
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
-import numpy as np
 import os
-import sys
-import json
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 # Import local modules
-from database import add_search_history, add_favorite_stock, is_favorite_stock, add_portfolio_holding
-from utils import calculate_moving_averages, calculate_rsi, calculate_bollinger_bands, calculate_macd
-from ai_utils import screen_stocks
-
-# Import OpenAI
-import openai
+from database import add_search_history, add_favorite_stock, add_portfolio_holding
+from ai_utils import screen_stocks, OPENAI_MODEL, make_llm_cache_key, get_cached_llm_response, cache_llm_response
 
 # Configure page
 st.set_page_config(
@@ -26,18 +18,35 @@ st.set_page_config(
 
 # Set up OpenAI client
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
+
+@st.cache_resource
+def get_openai_client():
+    """Create the OpenAI client once and reuse it (and its connection pool) across reruns"""
+    # Imported lazily - only needed once a screening query is actually sent
+    import openai
+    return openai.OpenAI(api_key=OPENAI_API_KEY)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_price_history(tickers, period='6mo'):
+    """Download price history for a ticker or list of tickers, cached for 5 minutes across reruns"""
+    return yf.download(tickers, period=period, progress=False, threads=True)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_ticker_info(ticker):
+    """Fetch the yfinance info dict for a ticker, cached for 5 minutes across reruns"""
+    # Info also carries the current price, so it shares the short TTL
+    return yf.Ticker(ticker).info
 
 def get_stock_data(ticker, period='6mo'):
     """Get stock data for a specific ticker"""
     try:
         # Download stock data
-        data = yf.download(ticker, period=period, progress=False)
+        data = fetch_price_history(ticker, period)
         if data.empty:
             return None
         
         # Get stock info
-        stock_info = yf.Ticker(ticker).info
+        stock_info = fetch_ticker_info(ticker)
         return {'data': data, 'info': stock_info}
     except Exception as e:
         st.error(f"Error fetching data for {ticker}: {e}")
@@ -52,103 +61,110 @@ def screen_stocks_with_openai(query, max_results=5):
         return None
     
     try:
+        # Repeat queries are served from the on-disk cache instead of a new API call
+        cache_key = make_llm_cache_key('screen_stocks', query, max_results, OPENAI_MODEL)
+        cached_result = get_cached_llm_response(cache_key)
+        if cached_result is not None:
+            return cached_result
+        
         # Use the centralized function from ai_utils.py
-        result = screen_stocks(query, max_results)
+        result = screen_stocks(query, max_results, client=get_openai_client())
         
         # Check for errors
         if "Error:" in result.get("interpretation", ""):
             st.error(result["interpretation"])
             return None
-            
+        
+        cache_llm_response(cache_key, result)
         return result
     except Exception as e:
         st.error(f"Error calling OpenAI API: {e}")
         return None
 
+# Display formats for the numeric metric columns (kept numeric until rendering)
+METRIC_FORMATS = {
+    'Price': '${:.2f}',
+    'Market Cap (B)': '${:,.2f}B',
+    'P/E Ratio': '{:.2f}',
+    'Dividend Yield (%)': '{:.2f}%',
+    'YTD Change (%)': '{:.2f}%'
+}
+
+def fetch_ticker_metrics(ticker):
+    """Fetch key metrics for a single ticker"""
+    info = fetch_ticker_info(ticker)
+    
+    # Extract key metrics - missing numeric values stay None so the columns remain numeric
+    return {
+        'Ticker': ticker,
+        'Company': info.get('shortName', 'N/A'),
+        'Price': info.get('currentPrice', info.get('regularMarketPrice')),
+        'Market Cap (B)': info.get('marketCap') / 1e9 if info.get('marketCap') else None,
+        'P/E Ratio': info.get('trailingPE'),
+        'Dividend Yield (%)': info.get('dividendYield') * 100 if info.get('dividendYield') else None,
+        'YTD Change (%)': info.get('ytdReturn'),
+        'Sector': info.get('sector', 'N/A'),
+        'Industry': info.get('industry', 'N/A')
+    }
+
 def fetch_stock_metrics(ticker_list):
     """Fetch key metrics for a list of tickers"""
-    metrics_df = pd.DataFrame()
+    if not ticker_list:
+        return pd.DataFrame()
+    
+    # Fetch all tickers concurrently - each lookup is a blocking HTTP request
+    with ThreadPoolExecutor(max_workers=min(8, len(ticker_list))) as executor:
+        futures = [executor.submit(fetch_ticker_metrics, ticker) for ticker in ticker_list]
     
-    for ticker in ticker_list:
+    # Collect results in the original order, reporting failures from the main thread
+    rows = []
+    for ticker, future in zip(ticker_list, futures):
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            
-            # Extract key metrics
-            metrics = {
-                'Ticker': ticker,
-                'Company': info.get('shortName', 'N/A'),
-                'Price': info.get('currentPrice', info.get('regularMarketPrice', 'N/A')),
-                'Market Cap (B)': info.get('marketCap', 'N/A') / 1e9 if info.get('marketCap') else 'N/A',
-                'P/E Ratio': info.get('trailingPE', 'N/A'),
-                'Dividend Yield (%)': info.get('dividendYield', 0) * 100 if info.get('dividendYield') else 'N/A',
-                'YTD Change (%)': info.get('ytdReturn', 'N/A'),
-                'Sector': info.get('sector', 'N/A'),
-                'Industry': info.get('industry', 'N/A')
-            }
-            
-            # Add to dataframe
-            metrics_df = pd.concat([metrics_df, pd.DataFrame([metrics])], ignore_index=True)
-            
+            rows.append(future.result())
         except Exception as e:
             st.warning(f"Could not fetch metrics for {ticker}: {e}")
     
+    metrics_df = pd.DataFrame(rows)
+    
+    # Keep numeric columns as float64 with NaN for missing values
+    for column in METRIC_FORMATS:
+        if column in metrics_df.columns:
+            metrics_df[column] = pd.to_numeric(metrics_df[column], errors='coerce')
+    
     return metrics_df
 
 def display_stock_metrics(metrics_df):
     """Display stock metrics in a formatted table"""
-    # Format the metrics
-    formatted_df = metrics_df.copy()
-    
-    # Format numeric columns
-    if 'Market Cap (B)' in formatted_df.columns:
-        formatted_df['Market Cap (B)'] = formatted_df['Market Cap (B)'].apply(
-            lambda x: f"${x:.2f}B" if isinstance(x, (int, float)) else x
-        )
-    
-    if 'P/E Ratio' in formatted_df.columns:
-        formatted_df['P/E Ratio'] = formatted_df['P/E Ratio'].apply(
-            lambda x: f"{x:.2f}" if isinstance(x, (int, float)) else x
-        )
-    
-    if 'Dividend Yield (%)' in formatted_df.columns:
-        formatted_df['Dividend Yield (%)'] = formatted_df['Dividend Yield (%)'].apply(
-            lambda x: f"{x:.2f}%" if isinstance(x, (int, float)) else x
-        )
-    
-    if 'Price' in formatted_df.columns:
-        formatted_df['Price'] = formatted_df['Price'].apply(
-            lambda x: f"${x:.2f}" if isinstance(x, (int, float)) else x
-        )
-    
-    if 'YTD Change (%)' in formatted_df.columns:
-        formatted_df['YTD Change (%)'] = formatted_df['YTD Change (%)'].apply(
-            lambda x: f"{x:.2f}%" if isinstance(x, (int, float)) else x
-        )
+    # Format numeric columns at render time so the data stays numeric
+    formats = {column: fmt for column, fmt in METRIC_FORMATS.items() if column in metrics_df.columns}
+    styled_df = metrics_df.style.format(formats, na_rep='N/A')
     
     # Display the table
-    st.dataframe(formatted_df, use_container_width=True)
+    st.dataframe(styled_df, use_container_width=True)
 
 def generate_stock_comparison_chart(tickers, period='6mo'):
     """Generate a comparison chart for multiple tickers"""
     if not tickers:
         return None
     
-    # Download data
-    comparison_data = {}
-    for ticker in tickers:
-        try:
-            stock_data = yf.download(ticker, period=period, progress=False)
-            if not stock_data.empty and 'Close' in stock_data.columns:
-                comparison_data[ticker] = stock_data['Close']
-        except Exception as e:
-            st.warning(f"Could not fetch data for {ticker}: {e}")
+    # Download all tickers in a single multi-ticker request
+    try:
+        stock_data = fetch_price_history(list(tickers), period)
+    except Exception as e:
+        st.warning(f"Could not fetch comparison data: {e}")
+        return None
     
-    if not comparison_data:
+    if stock_data.empty or 'Close' not in stock_data.columns:
         return None
     
-    # Create dataframe
-    df = pd.DataFrame(comparison_data)
+    # One close column per ticker, dropping tickers that returned no data
+    df = stock_data['Close']
+    if isinstance(df, pd.Series):
+        df = df.to_frame(name=tickers[0])
+    df = df.dropna(axis=1, how='all')
+    
+    if df.empty:
+        return None
     
     # Normalize data (starting at 100)
     normalized_df = df.dropna(how='all')
@@ -157,21 +173,18 @@ def generate_stock_comparison_chart(tickers, period='6mo'):
     if first_valid_idx is None:
         return None
     
-    # Normalize each column individually
-    normalized_data = {}
-    for column in normalized_df.columns:
-        first_val = normalized_df.loc[first_valid_idx, column]
-        if pd.notna(first_val) and first_val != 0:
-            normalized_data[column] = (normalized_df[column] / first_val) * 100
-    
-    normalized_df = pd.DataFrame(normalized_data, index=normalized_df.index)
+    # Divide every column by its first value in one step; columns whose first
+    # value is missing or zero come out all-NaN and are dropped
+    first_row = normalized_df.loc[first_valid_idx]
+    first_row = first_row.where(first_row != 0)
+    normalized_df = (normalized_df.div(first_row, axis=1) * 100).dropna(axis=1, how='all')
     
     # Create the chart
     fig = go.Figure()
     
     for column in normalized_df.columns:
         fig.add_trace(
-            go.Scatter(
+            go.Scattergl(
                 x=normalized_df.index,
                 y=normalized_df[column],
                 mode='lines',
@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import yfinance as yf
-from datetime import datetime, timedelta
+import numpy as np
+import math
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 import database as db
+from market_data import fetch_current_prices
 
 # Set page title
 st.set_page_config(
@@ -20,112 +22,221 @@ from monetization import is_feature_available, display_feature_teaser
 st.title("💼 Portfolio Tracker")
 st.markdown("Track your investments and analyze your portfolio performance.")
 
+# Number of holdings shown per page in the Edit Holdings list
+HOLDINGS_PER_PAGE = 10
+
+# Display formats for the numeric portfolio columns
+DISPLAY_FORMATS = {
+    'Purchase Price': '${:,.2f}',
+    'Current Price': '${:,.2f}',
+    'Current Value': '${:,.2f}',
+    'Cost Basis': '${:,.2f}',
+    'Profit/Loss': '${:,.2f}',
+    'Profit/Loss %': '{:.2f}%',
+    'Sell Price': '${:,.2f}',
+    'Realized Gain': '${:,.2f}'
+}
+
+# Details tab views: view name -> (holding status to show, None for all; columns to display)
+DETAIL_VIEWS = {
+    "Active Holdings": ('Active', ['Ticker', 'Company', 'Sector', 'Shares', 'Purchase Price', 'Current Price', 
+                                   'Current Value', 'Profit/Loss', 'Profit/Loss %', 'Days Held']),
+    "Watchlist": ('Watchlist', ['Ticker', 'Company', 'Sector', 'Shares', 'Purchase Price', 'Current Price', 
+                                'Current Value', 'Notes']),
+    "Sold Positions": ('Sold', ['Ticker', 'Company', 'Sector', 'Shares', 'Purchase Price', 'Sell Price', 
+                                'Realized Gain', 'Days Held', 'Sell Date']),
+    "All Holdings": (None, ['Ticker', 'Company', 'Status', 'Shares', 'Purchase Price', 'Current Price', 
+                            'Current Value', 'Profit/Loss', 'Profit/Loss %'])
+}
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_ticker_info(ticker):
+    """Get the yfinance info dict for a ticker, cached for 5 minutes across reruns"""
+    import yfinance as yf
+    return yf.Ticker(ticker).info
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_last_price(ticker):
+    """Get the latest price for a ticker from yfinance's lightweight fast_info, cached for 5 minutes"""
+    import yfinance as yf
+    return yf.Ticker(ticker).fast_info.get('last_price', 0)
+
+def fetch_for_tickers(fetch, tickers, default):
+    """
+    Run a per-ticker yfinance lookup for several tickers concurrently
+    
+    Parameters:
+    - fetch: Function taking a ticker symbol
+    - tickers: Collection of unique ticker symbols
+    - default: Value used for tickers whose lookup fails
+    
+    Returns:
+    - Dictionary mapping each ticker to its result
+    """
+    results = {}
+    if not tickers:
+        return results
+    
+    with ThreadPoolExecutor(max_workers=min(32, len(tickers))) as executor:
+        futures = {executor.submit(fetch, ticker): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception:
+                results[futures[future]] = default
+    
+    return results
+
+def compute_position_values(shares, purchase_price, sell_price, current_price, is_sold):
+    """
+    Compute per-position values from float arrays in one vectorized pass
+    
+    Parameters:
+    - shares, purchase_price, sell_price, current_price: Equal-length float arrays;
+      missing purchase/sell prices are NaN
+    - is_sold: Boolean array marking the positions that have been sold
+    
+    Returns:
+    - Tuple of arrays (current_value, cost_basis, profit_loss, profit_loss_percent, realized_gain)
+    """
+    # Sold positions use their sell value instead of current value
+    cost_basis = purchase_price * shares
+    current_value = np.where(is_sold, sell_price, current_price) * shares
+    realized_gain = np.where(is_sold, (sell_price - purchase_price) * shares, np.nan)
+    
+    # Unrealized profit/loss (NaN when there is no purchase price)
+    profit_loss = current_value - cost_basis
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_loss_percent = np.where(cost_basis > 0, profit_loss / cost_basis * 100, np.nan)
+    
+    return current_value, cost_basis, profit_loss, profit_loss_percent, realized_gain
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def portfolio_csv(df):
+    """Serialize the portfolio DataFrame to CSV bytes, cached on the DataFrame's contents"""
+    try:
+        # PyArrow's C++ CSV writer (installed with Streamlit) produces UTF-8 bytes directly
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        buffer = io.BytesIO()
+        df.to_csv(buffer, index=False, chunksize=10_000)
+        return buffer.getvalue()
+    
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink)
+    return sink.getvalue().to_pybytes()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def sector_pie_figure(sectors, values):
+    """Build the sector allocation pie chart, reused while the (sector, value) tuples are unchanged"""
+    import plotly.express as px
+    fig = px.pie(
+        values=list(values), 
+        names=list(sectors),
+        title="Portfolio Allocation by Sector",
+        labels={'values': 'Value ($)', 'names': 'Sector'}
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
 # Function to calculate portfolio performance
 def calculate_portfolio_performance(holdings):
     if not holdings:
         return pd.DataFrame(), 0, 0, 0, 0, 0
     
-    portfolio_data = []
-    total_value = 0
-    total_cost = 0
-    total_realized_gain = 0
+    # Build one frame from the holdings rows (column order taken from the query) and
+    # compute everything column-wise
+    holdings_df = pd.DataFrame.from_records(holdings, columns=list(holdings[0].keys()), coerce_float=True)
+    has_sector = holdings_df['sector'].astype(bool)
     
-    # Keep track of sectors
-    sector_lookup = {}
+    # Prices come from one batched download, with the lightweight fast_info endpoint
+    # as a fallback for tickers missing from it; the full info blob is only fetched
+    # for tickers whose sector still needs to be discovered
+    tickers = sorted(set(holdings_df['ticker']))
+    price_map = fetch_current_prices(tickers)
+    price_map.update(fetch_for_tickers(get_last_price, [ticker for ticker in tickers if ticker not in price_map], 0))
+    info_map = fetch_for_tickers(get_ticker_info, set(holdings_df.loc[~has_sector, 'ticker']), {})
     
-    for holding in holdings:
-        ticker = holding['ticker']
-        shares = holding['shares']
-        purchase_price = holding['purchase_price'] if holding['purchase_price'] else 0
-        sell_price = holding['sell_price'] if holding['sell_price'] else 0
-        is_watchlist = holding['is_watchlist'] == 1
-        
-        # Get latest data for the ticker
-        ticker_data = yf.Ticker(ticker)
-        info = ticker_data.info
-        
-        current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-        company_name = info.get('shortName', ticker)
-        
-        # Get sector if not provided
-        sector = holding['sector']
-        if not sector and ticker not in sector_lookup:
-            sector = info.get('sector', 'Not Available')
-            sector_lookup[ticker] = sector
-        elif ticker in sector_lookup:
-            sector = sector_lookup[ticker]
-        
-        # Calculate values
-        current_value = current_price * shares
-        cost_basis = purchase_price * shares if purchase_price else 0
-        
-        # Handle sold stocks
-        realized_gain = 0
-        if sell_price and sell_price > 0:
-            realized_gain = (sell_price - purchase_price) * shares if purchase_price else 0
-            current_value = sell_price * shares  # Use sell value instead of current value
-            total_realized_gain += realized_gain
-        
-        # Calculate unrealized profit/loss for active positions
-        profit_loss = current_value - cost_basis if purchase_price else 0
-        profit_loss_percent = (profit_loss / cost_basis * 100) if cost_basis > 0 else 0
-        
-        # Calculate days held
-        purchase_date = datetime.strptime(holding['purchase_date'], '%Y-%m-%d') if holding['purchase_date'] else None
-        sell_date = datetime.strptime(holding['sell_date'], '%Y-%m-%d') if holding['sell_date'] else None
-        
-        days_held = None
-        if purchase_date:
-            if sell_date:
-                days_held = (sell_date - purchase_date).days
-            else:
-                days_held = (datetime.now() - purchase_date).days
-        
-        # Add to totals (watchlist items don't count toward totals)
-        if not is_watchlist:
-            total_value += current_value
-            if purchase_price:
-                total_cost += cost_basis
-        
-        # Create row
-        portfolio_data.append({
-            'ID': holding['id'],
-            'Ticker': ticker,
-            'Company': company_name,
-            'Sector': sector,
-            'Shares': shares,
-            'Purchase Price': f"${purchase_price:.2f}" if purchase_price else "Not Set",
-            'Purchase Date': holding['purchase_date'] if holding['purchase_date'] else "Not Set",
-            'Current Price': f"${current_price:.2f}",
-            'Current Value': current_value,
-            'Cost Basis': cost_basis if purchase_price else "Not Set",
-            'Profit/Loss': profit_loss if purchase_price else "Not Set",
-            'Profit/Loss %': f"{profit_loss_percent:.2f}%" if purchase_price else "Not Set",
-            'Is Watchlist': is_watchlist,
-            'Sell Price': f"${sell_price:.2f}" if sell_price else "Not Set",
-            'Sell Date': holding['sell_date'] if holding['sell_date'] else "Not Set",
-            'Realized Gain': realized_gain if sell_price and purchase_price else "Not Set",
-            'Status': "Sold" if sell_price and sell_price > 0 else ("Watchlist" if is_watchlist else "Active"),
-            'Days Held': days_held if days_held is not None else "N/A",
-            'Date Added': holding['date_added'],
-            'Notes': holding['notes'] if holding['notes'] else ""
-        })
-    
-    # Create DataFrame
-    df = pd.DataFrame(portfolio_data)
+    # Missing (or zero) purchase and sell prices become NaN so they propagate through the
+    # math without branches; a missing current quote falls back to a price of 0
+    shares = holdings_df['shares'].to_numpy(dtype=float)
+    purchase_price = pd.to_numeric(holdings_df['purchase_price'], errors='coerce').to_numpy(dtype=float)
+    purchase_price[purchase_price <= 0] = np.nan
+    sell_price = pd.to_numeric(holdings_df['sell_price'], errors='coerce').to_numpy(dtype=float)
+    sell_price[sell_price <= 0] = np.nan
+    current_price = pd.to_numeric(holdings_df['ticker'].map(price_map), errors='coerce').fillna(0).to_numpy(dtype=float)
+    
+    is_sold = sell_price > 0
+    is_watchlist = (holdings_df['is_watchlist'] == 1).to_numpy()
+    
+    current_value, cost_basis, profit_loss, profit_loss_percent, realized_gain = compute_position_values(
+        shares, purchase_price, sell_price, current_price, is_sold
+    )
+    
+    # Use the stored sector, falling back to the one reported by yfinance
+    sector = holdings_df['sector'].where(
+        has_sector, holdings_df['ticker'].map(lambda ticker: info_map.get(ticker, {}).get('sector', 'Not Available'))
+    )
+    
+    # Store newly discovered sectors so later page loads don't look them up again
+    discovered_sectors = {
+        int(holding_id): info_map[ticker]['sector']
+        for holding_id, ticker in zip(holdings_df.loc[~has_sector, 'id'], holdings_df.loc[~has_sector, 'ticker'])
+        if info_map.get(ticker, {}).get('sector')
+    }
+    if discovered_sectors:
+        db.update_holding_sectors(discovered_sectors)
+    
+    company = holdings_df['company_name'].where(holdings_df['company_name'].astype(bool), holdings_df['ticker'])
+    
+    # Calculate days held (up to the sell date, or today for open positions)
+    purchase_dt = pd.to_datetime(holdings_df['purchase_date'], format='%Y-%m-%d', errors='coerce')
+    sell_dt = pd.to_datetime(holdings_df['sell_date'], format='%Y-%m-%d', errors='coerce')
+    days_held = (sell_dt.fillna(pd.Timestamp.now()) - purchase_dt).dt.days
+    
+    status = pd.Categorical(
+        np.select([is_sold, is_watchlist], ["Sold", "Watchlist"], default="Active"),
+        categories=["Active", "Watchlist", "Sold"]
+    )
+    
+    # Numeric columns stay numeric; values that don't apply are NaN and formatted at display time
+    df = pd.DataFrame({
+        'ID': holdings_df['id'],
+        'Ticker': holdings_df['ticker'],
+        'Company': company,
+        'Sector': sector,
+        'Shares': shares,
+        'Purchase Price': purchase_price,
+        'Purchase Date': holdings_df['purchase_date'].where(holdings_df['purchase_date'].astype(bool), "Not Set"),
+        'Current Price': current_price,
+        'Current Value': current_value,
+        'Cost Basis': cost_basis,
+        'Profit/Loss': profit_loss,
+        'Profit/Loss %': profit_loss_percent,
+        'Is Watchlist': is_watchlist,
+        'Sell Price': sell_price,
+        'Sell Date': holdings_df['sell_date'].where(holdings_df['sell_date'].astype(bool), "Not Set"),
+        'Realized Gain': realized_gain,
+        'Status': status,
+        'Days Held': days_held,
+        'Date Added': holdings_df['date_added'],
+        'Notes': holdings_df['notes'].where(holdings_df['notes'].astype(bool), "")
+    })
+    
+    # Totals (watchlist items don't count toward totals)
+    total_value = np.nansum(current_value[~is_watchlist])
+    total_cost = np.nansum(cost_basis[~is_watchlist])
+    total_realized_gain = np.nansum(realized_gain)
     
     # Calculate total profit/loss and average return
     total_profit_loss = total_value - total_cost
     total_profit_loss_percent = (total_profit_loss / total_cost * 100) if total_cost > 0 else 0
     
-    # Calculate average return percentage across positions
-    # Filter to only include non-watchlist items with a purchase price
-    active_positions = [row for row in portfolio_data if not row['Is Watchlist'] and not isinstance(row['Profit/Loss %'], str)]
-    if active_positions:
-        avg_return_pct = sum([float(row['Profit/Loss %'].replace('%', '')) for row in active_positions if not isinstance(row['Profit/Loss %'], str)]) / len(active_positions)
-    else:
-        avg_return_pct = 0
-    
+    # Calculate average return percentage across non-watchlist positions with a purchase price
+    active_returns = profit_loss_percent[~is_watchlist]
+    avg_return_pct = np.nanmean(active_returns) if np.isfinite(active_returns).any() else 0
+
     return df, total_value, total_profit_loss, total_profit_loss_percent, avg_return_pct, total_realized_gain
 
 # Initialize session state for filters
@@ -181,6 +292,370 @@ with filter_col4:
         st.session_state.filter_type = None
         st.rerun()
 
+@st.fragment
+def edit_holding_form(holding):
+    """Render the edit form for one holding; interacting with it only reruns this fragment"""
+    # Get status label
+    status_label = ""
+    if holding['is_watchlist'] == 1:
+        status_label = "🔍 WATCHLIST"
+    elif holding['sell_price'] and holding['sell_price'] > 0:
+        status_label = "💰 SOLD"
+    
+    # Display holding for editing
+    with st.expander(f"{holding['ticker']} - {holding['shares']} shares {status_label}"):
+        with st.form(f"edit_form_{holding['id']}"):
+            is_watchlist = holding['is_watchlist'] == 1
+            is_sold = holding['sell_price'] is not None and holding['sell_price'] > 0
+            
+            shares = st.number_input(
+                "Shares", 
+                min_value=0.01, 
+                value=float(holding['shares']), 
+                key=f"shares_{holding['id']}"
+            )
+            
+            # Different UI for watchlist vs regular holdings
+            if is_watchlist:
+                price = st.number_input(
+                    "Target Price ($)", 
+                    min_value=0.0, 
+                    value=float(holding['purchase_price']) if holding['purchase_price'] else 0.0, 
+                    key=f"price_{holding['id']}"
+                )
+                date = None
+            else:
+                price = st.number_input(
+                    "Purchase Price ($)", 
+                    min_value=0.0, 
+                    value=float(holding['purchase_price']) if holding['purchase_price'] else 0.0, 
+                    key=f"price_{holding['id']}"
+                )
+                
+                date = st.date_input(
+                    "Purchase Date", 
+                    value=datetime.strptime(holding['purchase_date'], '%Y-%m-%d') if holding['purchase_date'] else datetime.today(),
+                    key=f"date_{holding['id']}"
+                )
+            
+            # For sold positions, show sell information
+            if is_sold:
+                sell_price = st.number_input(
+                    "Sell Price ($)", 
+                    min_value=0.0, 
+                    value=float(holding['sell_price']), 
+                    key=f"sell_price_{holding['id']}"
+                )
+                
+                sell_date = st.date_input(
+                    "Sell Date", 
+                    value=datetime.strptime(holding['sell_date'], '%Y-%m-%d') if holding['sell_date'] else datetime.today(),
+                    key=f"sell_date_{holding['id']}"
+                )
+            else:
+                sell_price = None
+                sell_date = None
+            
+            # Sector input
+            sector = st.text_input(
+                "Sector",
+                value=holding['sector'] if holding['sector'] else "",
+                key=f"sector_{holding['id']}"
+            )
+            
+            notes = st.text_area(
+                "Notes", 
+                value=holding['notes'] if holding['notes'] else "",
+                key=f"notes_{holding['id']}"
+            )
+            
+            # For watchlist items, add convert option
+            if is_watchlist:
+                convert_watchlist = st.checkbox("Convert to portfolio position", key=f"convert_{holding['id']}")
+            else:
+                convert_watchlist = False
+            
+            # For active positions, add mark as sold option
+            if not is_watchlist and not is_sold:
+                mark_as_sold = st.checkbox("Mark as sold", key=f"sell_{holding['id']}")
+                if mark_as_sold:
+                    sell_price = st.number_input(
+                        "Sell Price ($)", 
+                        min_value=0.0, 
+                        value=0.0, 
+                        key=f"new_sell_price_{holding['id']}"
+                    )
+                    
+                    sell_date = st.date_input(
+                        "Sell Date", 
+                        value=datetime.today(),
+                        key=f"new_sell_date_{holding['id']}"
+                    )
+            else:
+                mark_as_sold = False
+            
+            # Use side-by-side buttons without columns (to avoid nesting columns)
+            update_col, delete_col = st.columns(2)
+            update = update_col.form_submit_button("Update")
+            delete = delete_col.form_submit_button("Delete", type="primary")
+            
+            if update:
+                # If converting from watchlist to portfolio
+                if is_watchlist and convert_watchlist:
+                    # Need purchase date for portfolio position
+                    purchase_date = datetime.today().strftime('%Y-%m-%d')
+                    
+                    success = db.update_portfolio_holding(
+                        holding['id'],
+                        shares,
+                        price if price > 0 else None,
+                        purchase_date,
+                        sell_price=None,
+                        sell_date=None,
+                        is_watchlist=0,  # Convert to regular position
+                        sector=sector if sector else None,
+                        notes=notes
+                    )
+                # If marking as sold
+                elif not is_watchlist and not is_sold and mark_as_sold:
+                    success = db.update_portfolio_holding(
+                        holding['id'],
+                        shares,
+                        price if price > 0 else None,
+                        date.strftime('%Y-%m-%d') if date else None,
+                        sell_price=sell_price if sell_price and sell_price > 0 else None,
+                        sell_date=sell_date.strftime('%Y-%m-%d') if sell_date else None,
+                        is_watchlist=0,
+                        sector=sector if sector else None,
+                        notes=notes
+                    )
+                # Regular update
+                else:
+                    success = db.update_portfolio_holding(
+                        holding['id'],
+                        shares,
+                        price if price > 0 else None,
+                        date.strftime('%Y-%m-%d') if date else None,
+                        sell_price=sell_price if sell_price and sell_price > 0 else None,
+                        sell_date=sell_date.strftime('%Y-%m-%d') if sell_date else None,
+                        is_watchlist=1 if is_watchlist else 0,
+                        sector=sector if sector else None,
+                        notes=notes
+                    )
+                
+                if success:
+                    st.success("Holding updated successfully!")
+                    st.rerun()
+                else:
+                    st.error("Failed to update holding.")
+            
+            if delete:
+                if db.remove_portfolio_holding(holding['id']):
+                    st.success("Holding deleted successfully!")
+                    st.rerun()
+                else:
+                    st.error("Failed to delete holding.")
+
+@st.fragment
+def render_portfolio_overview(holdings):
+    """Render the portfolio summary, charts and export; tab controls only rerun this fragment"""
+    # Calculate portfolio performance
+    df, total_value, total_profit_loss, total_profit_loss_percent, avg_return_pct, total_realized_gain = calculate_portfolio_performance(holdings)
+    
+    # Apply gainers/losers filter after getting data
+    if st.session_state.filter_type == 'gainers' and not df.empty:
+        # Filter to only include positions with positive returns
+        df = df[df['Profit/Loss'] > 0]
+    elif st.session_state.filter_type == 'losers' and not df.empty:
+        # Filter to only include positions with negative returns
+        df = df[df['Profit/Loss'] < 0]
+    
+    if df.empty:
+        st.info("Add stocks to your portfolio to see your performance data here.")
+    else:
+        # Plotly is only needed once there is data to chart
+        import plotly.express as px
+        
+        # Masks shared by the overview, allocation and details views
+        mask_active = df['Status'].eq('Active')
+        mask_watchlist = df['Status'].eq('Watchlist')
+        mask_sold = df['Status'].eq('Sold')
+        mask_nonwatch = ~df['Is Watchlist']
+        
+        # Portfolio summary metrics
+        st.subheader("Portfolio Summary")
+        
+        # Create metrics rows
+        metric_col1, metric_col2, metric_col3 = st.columns(3)
+        
+        with metric_col1:
+            st.metric("Total Portfolio Value", f"${total_value:.2f}")
+        
+        with metric_col2:
+            delta_color = "normal" if total_profit_loss >= 0 else "inverse"
+            st.metric("Unrealized Profit/Loss", f"${total_profit_loss:.2f}", f"{total_profit_loss_percent:.2f}%", delta_color=delta_color)
+        
+        with metric_col3:
+            st.metric("Number of Holdings", len(df))
+        
+        # Second row of metrics
+        metric2_col1, metric2_col2, metric2_col3 = st.columns(3)
+        
+        with metric2_col1:
+            st.metric("Realized Gains", f"${total_realized_gain:.2f}")
+        
+        with metric2_col2:
+            avg_return_color = "normal" if avg_return_pct >= 0 else "inverse"
+            st.metric("Average Return", f"{avg_return_pct:.2f}%", delta_color=avg_return_color)
+        
+        with metric2_col3:
+            # Count holdings by status
+            status_counts = df['Status'].value_counts()
+            active_count = status_counts.get('Active', 0)
+            watchlist_count = status_counts.get('Watchlist', 0)
+            sold_count = status_counts.get('Sold', 0)
+            
+            status_text = f"Active: {active_count}"
+            if watchlist_count > 0:
+                status_text += f" | Watch: {watchlist_count}"
+            if sold_count > 0:
+                status_text += f" | Sold: {sold_count}"
+                
+            st.metric("Holdings by Status", status_text)
+        
+        # Show tabs for different views
+        overview_tab, allocation_tab, details_tab = st.tabs(["Overview", "Allocation", "Details"])
+        
+        with overview_tab:
+            # Show allocations by ticker
+            st.subheader("Portfolio Breakdown")
+            
+            # Create visualization based on holding status
+            df_active = df[mask_active]
+            if not df_active.empty:
+                # Create stacked bar chart showing active holdings
+                fig_breakdown = px.bar(
+                    df_active,
+                    x="Ticker",
+                    y="Current Value",
+                    color="Profit/Loss %",
+                    color_continuous_scale=[(0, "red"), (0.5, "yellow"), (1, "green")],
+                    labels={"Current Value": "Value ($)", "Ticker": "Stock Symbol"},
+                    title="Active Holdings Breakdown",
+                    hover_data=["Company", "Shares", "Purchase Price", "Current Price", "Profit/Loss"]
+                )
+                
+                fig_breakdown.update_layout(
+                    xaxis_title="Stock",
+                    yaxis_title="Value ($)",
+                    coloraxis_colorbar_title="Return %"
+                )
+                
+                st.plotly_chart(fig_breakdown, use_container_width=True)
+            else:
+                st.info("No active holdings to display.")
+        
+        with allocation_tab:
+            # View allocations by different dimensions
+            alloc_type = st.radio("Allocation View", ["By Stock", "By Sector"], horizontal=True)
+            
+            if alloc_type == "By Stock":
+                # Filter to exclude watchlist items for value allocation
+                df_value = df[mask_nonwatch]
+                
+                if not df_value.empty:
+                    # Create pie chart by stock
+                    fig_pie = px.pie(
+                        df_value, 
+                        values='Current Value', 
+                        names='Ticker',
+                        title="Portfolio Allocation by Stock",
+                        hover_data=['Company', 'Shares', 'Profit/Loss %', 'Status'],
+                        labels={'Current Value': 'Value ($)'}
+                    )
+                    
+                    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                    
+                    st.plotly_chart(fig_pie, use_container_width=True)
+                else:
+                    st.info("No holdings data available for stock allocation view.")
+            else:
+                # Filter to exclude watchlist items for sector allocation
+                mask_sector = mask_nonwatch & df['Sector'].notna()
+                
+                # Only the two aggregated columns are selected, and only when there are rows to chart
+                if mask_sector.any():
+                    df_sector = df.loc[mask_sector, ['Sector', 'Current Value']]
+                    
+                    # Sum values per sector with a weighted bincount over the category codes
+                    sector_cat = df_sector['Sector'].astype('category')
+                    sector_sums = np.bincount(
+                        sector_cat.cat.codes.to_numpy(),
+                        weights=df_sector['Current Value'].to_numpy(dtype=np.float64),
+                        minlength=len(sector_cat.cat.categories)
+                    )
+                    
+                    # Figure is rebuilt only when the aggregated sector values change
+                    fig_sector = sector_pie_figure(
+                        tuple(sector_cat.cat.categories),
+                        tuple(sector_sums.tolist())
+                    )
+                    
+                    st.plotly_chart(fig_sector, use_container_width=True)
+                else:
+                    st.info("No sector data available. Add sector information to your holdings.")
+        
+        with details_tab:
+            # Select view type
+            view_type = st.radio("View Type", list(DETAIL_VIEWS), horizontal=True)
+            
+            status, display_cols = DETAIL_VIEWS[view_type]
+            status_masks = {'Active': mask_active, 'Watchlist': mask_watchlist, 'Sold': mask_sold}
+            view_mask = slice(None) if status is None else status_masks[status]
+            
+            # Filter to only include available columns
+            display_cols = [col for col in display_cols if col in df.columns]
+            
+            # Select rows and columns in one step - the frame is only read for display
+            display_df = df.loc[view_mask, display_cols]
+            
+            if not display_df.empty:
+                # Format numeric columns at render time; the data itself stays numeric
+                value_formats = {col: fmt for col, fmt in DISPLAY_FORMATS.items() if col in display_cols}
+                styled_df = display_df.style.format(value_formats, na_rep="Not Set")
+                if 'Days Held' in display_cols:
+                    styled_df = styled_df.format('{:.0f}', subset=['Days Held'], na_rep="N/A")
+                
+                st.dataframe(styled_df, use_container_width=True)
+            else:
+                st.info(f"No data available for '{view_type}' view.")
+        
+        # Export options
+        st.subheader("Export Portfolio Data")
+        
+        # Only serialize the portfolio once the user asks for an export
+        if st.button("Prepare CSV Export", key="prepare_export"):
+            st.session_state.want_export = True
+        
+        if st.session_state.get('want_export'):
+            # Convert DataFrame to CSV (reused across reruns while the data is unchanged)
+            csv = portfolio_csv(df)
+            
+            # Download button
+            st.download_button(
+                label="Download Portfolio Data (CSV)",
+                data=csv,
+                file_name=f"portfolio_data_{datetime.now().strftime('%Y-%m-%d')}.csv",
+                mime="text/csv"
+            )
+
+# Get filtered holdings once for both columns (gainers/losers are applied after pricing)
+filtered_holdings = db.get_portfolio_holdings(
+    include_watchlist=st.session_state.include_watchlist,
+    sector=st.session_state.selected_sector,
+    filter_type=st.session_state.filter_type if st.session_state.filter_type not in ['gainers', 'losers'] else None
+)
+
 # Main content area
 col1, col2 = st.columns([1, 2])
 
@@ -207,8 +682,7 @@ with col1:
             if submitted and ticker_input and shares_input > 0:
                 try:
                     # Verify ticker exists
-                    ticker_data = yf.Ticker(ticker_input)
-                    info = ticker_data.info
+                    info = get_ticker_info(ticker_input)
                     company_name = info.get('shortName', ticker_input)
                     
                     # Get sector if not provided
@@ -240,8 +714,7 @@ with col1:
     # Record Sale Tab
     with sell_tab:
         # Get active holdings (non-watchlist, non-sold)
-        active_holdings = [h for h in db.get_portfolio_holdings(include_watchlist=False, filter_type='active') 
-                          if h['sell_price'] is None or h['sell_price'] == 0]
+        active_holdings = db.get_portfolio_holdings(filter_type='active')
         
         if not active_holdings:
             st.info("You don't have any active positions to sell. Add a position first.")
@@ -267,8 +740,7 @@ with col1:
                     purchase_price = selected_holding['purchase_price'] if selected_holding['purchase_price'] else 0
                     
                     # Get current market price
-                    ticker_data = yf.Ticker(ticker)
-                    current_price = ticker_data.info.get('currentPrice', ticker_data.info.get('regularMarketPrice', 0))
+                    current_price = get_last_price(ticker)
                     
                     st.info(f"Current market price: ${current_price:.2f}")
                     
@@ -315,8 +787,7 @@ with col1:
             if submitted and ticker_input:
                 try:
                     # Verify ticker exists
-                    ticker_data = yf.Ticker(ticker_input)
-                    info = ticker_data.info
+                    info = get_ticker_info(ticker_input)
                     company_name = info.get('shortName', ticker_input)
                     sector = info.get('sector', None)
                     
@@ -348,382 +819,27 @@ with col1:
     # Check if unlimited portfolio is available, otherwise limit to 10 stocks (free plan limit)
     has_unlimited_portfolio = is_feature_available('unlimited_portfolio')
     
-    # Get filtered holdings
-    all_holdings = db.get_portfolio_holdings(
-        include_watchlist=st.session_state.include_watchlist,
-        sector=st.session_state.selected_sector,
-        filter_type=st.session_state.filter_type if st.session_state.filter_type not in ['gainers', 'losers'] else None
-    )
-    
     # Apply portfolio limit for free tier
-    if not has_unlimited_portfolio and len(all_holdings) > 10:
-        holdings = all_holdings[:10]
+    if not has_unlimited_portfolio and len(filtered_holdings) > 10:
+        holdings = filtered_holdings[:10]
         display_feature_teaser('unlimited_portfolio')
     else:
-        holdings = all_holdings
+        holdings = filtered_holdings
     
     if not holdings:
         st.info("No holdings match your current filters. Adjust the filters or add new holdings.")
     else:
-        for holding in holdings:
-            # Get status label
-            status_label = ""
-            if holding['is_watchlist'] == 1:
-                status_label = "🔍 WATCHLIST"
-            elif holding['sell_price'] and holding['sell_price'] > 0:
-                status_label = "💰 SOLD"
-            
-            # Display holding for editing
-            with st.expander(f"{holding['ticker']} - {holding['shares']} shares {status_label}"):
-                with st.form(f"edit_form_{holding['id']}"):
-                    is_watchlist = holding['is_watchlist'] == 1
-                    is_sold = holding['sell_price'] is not None and holding['sell_price'] > 0
-                    
-                    shares = st.number_input(
-                        "Shares", 
-                        min_value=0.01, 
-                        value=float(holding['shares']), 
-                        key=f"shares_{holding['id']}"
-                    )
-                    
-                    # Different UI for watchlist vs regular holdings
-                    if is_watchlist:
-                        price = st.number_input(
-                            "Target Price ($)", 
-                            min_value=0.0, 
-                            value=float(holding['purchase_price']) if holding['purchase_price'] else 0.0, 
-                            key=f"price_{holding['id']}"
-                        )
-                        date = None
-                    else:
-                        price = st.number_input(
-                            "Purchase Price ($)", 
-                            min_value=0.0, 
-                            value=float(holding['purchase_price']) if holding['purchase_price'] else 0.0, 
-                            key=f"price_{holding['id']}"
-                        )
-                        
-                        date = st.date_input(
-                            "Purchase Date", 
-                            value=datetime.strptime(holding['purchase_date'], '%Y-%m-%d') if holding['purchase_date'] else datetime.today(),
-                            key=f"date_{holding['id']}"
-                        )
-                    
-                    # For sold positions, show sell information
-                    if is_sold:
-                        sell_price = st.number_input(
-                            "Sell Price ($)", 
-                            min_value=0.0, 
-                            value=float(holding['sell_price']), 
-                            key=f"sell_price_{holding['id']}"
-                        )
-                        
-                        sell_date = st.date_input(
-                            "Sell Date", 
-                            value=datetime.strptime(holding['sell_date'], '%Y-%m-%d') if holding['sell_date'] else datetime.today(),
-                            key=f"sell_date_{holding['id']}"
-                        )
-                    else:
-                        sell_price = None
-                        sell_date = None
-                    
-                    # Sector input
-                    sector = st.text_input(
-                        "Sector",
-                        value=holding['sector'] if holding['sector'] else "",
-                        key=f"sector_{holding['id']}"
-                    )
-                    
-                    notes = st.text_area(
-                        "Notes", 
-                        value=holding['notes'] if holding['notes'] else "",
-                        key=f"notes_{holding['id']}"
-                    )
-                    
-                    # For watchlist items, add convert option
-                    if is_watchlist:
-                        convert_watchlist = st.checkbox("Convert to portfolio position", key=f"convert_{holding['id']}")
-                    else:
-                        convert_watchlist = False
-                    
-                    # For active positions, add mark as sold option
-                    if not is_watchlist and not is_sold:
-                        mark_as_sold = st.checkbox("Mark as sold", key=f"sell_{holding['id']}")
-                        if mark_as_sold:
-                            sell_price = st.number_input(
-                                "Sell Price ($)", 
-                                min_value=0.0, 
-                                value=0.0, 
-                                key=f"new_sell_price_{holding['id']}"
-                            )
-                            
-                            sell_date = st.date_input(
-                                "Sell Date", 
-                                value=datetime.today(),
-                                key=f"new_sell_date_{holding['id']}"
-                            )
-                    else:
-                        mark_as_sold = False
-                    
-                    # Use side-by-side buttons without columns (to avoid nesting columns)
-                    update_col, delete_col = st.columns(2)
-                    update = update_col.form_submit_button("Update")
-                    delete = delete_col.form_submit_button("Delete", type="primary")
-                    
-                    if update:
-                        # If converting from watchlist to portfolio
-                        if is_watchlist and convert_watchlist:
-                            # Need purchase date for portfolio position
-                            purchase_date = datetime.today().strftime('%Y-%m-%d')
-                            
-                            success = db.update_portfolio_holding(
-                                holding['id'],
-                                shares,
-                                price if price > 0 else None,
-                                purchase_date,
-                                sell_price=None,
-                                sell_date=None,
-                                is_watchlist=0,  # Convert to regular position
-                                sector=sector if sector else None,
-                                notes=notes
-                            )
-                        # If marking as sold
-                        elif not is_watchlist and not is_sold and mark_as_sold:
-                            success = db.update_portfolio_holding(
-                                holding['id'],
-                                shares,
-                                price if price > 0 else None,
-                                date.strftime('%Y-%m-%d') if date else None,
-                                sell_price=sell_price if sell_price and sell_price > 0 else None,
-                                sell_date=sell_date.strftime('%Y-%m-%d') if sell_date else None,
-                                is_watchlist=0,
-                                sector=sector if sector else None,
-                                notes=notes
-                            )
-                        # Regular update
-                        else:
-                            success = db.update_portfolio_holding(
-                                holding['id'],
-                                shares,
-                                price if price > 0 else None,
-                                date.strftime('%Y-%m-%d') if date else None,
-                                sell_price=sell_price if sell_price and sell_price > 0 else None,
-                                sell_date=sell_date.strftime('%Y-%m-%d') if sell_date else None,
-                                is_watchlist=1 if is_watchlist else 0,
-                                sector=sector if sector else None,
-                                notes=notes
-                            )
-                        
-                        if success:
-                            st.success("Holding updated successfully!")
-                            st.rerun()
-                        else:
-                            st.error("Failed to update holding.")
-                    
-                    if delete:
-                        if db.remove_portfolio_holding(holding['id']):
-                            st.success("Holding deleted successfully!")
-                            st.rerun()
-                        else:
-                            st.error("Failed to delete holding.")
+        # Page through holdings so only the visible edit forms are built
+        page_count = math.ceil(len(holdings) / HOLDINGS_PER_PAGE)
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1) if page_count > 1 else 1
+        page_start = (page - 1) * HOLDINGS_PER_PAGE
+        
+        for holding in holdings[page_start:page_start + HOLDINGS_PER_PAGE]:
+            edit_holding_form(holding)
 
 # COLUMN 2: Portfolio Overview
 with col2:
-    # Get portfolio data with filters
-    holdings = db.get_portfolio_holdings(
-        include_watchlist=st.session_state.include_watchlist,
-        sector=st.session_state.selected_sector,
-        filter_type=st.session_state.filter_type if st.session_state.filter_type not in ['gainers', 'losers'] else None
-    )
-    
-    # Calculate portfolio performance
-    df, total_value, total_profit_loss, total_profit_loss_percent, avg_return_pct, total_realized_gain = calculate_portfolio_performance(holdings)
-    
-    # Apply gainers/losers filter after getting data
-    if st.session_state.filter_type == 'gainers' and not df.empty:
-        # Filter to only include positions with positive returns
-        df = df[df['Profit/Loss'].apply(lambda x: isinstance(x, (int, float)) and x > 0)]
-    elif st.session_state.filter_type == 'losers' and not df.empty:
-        # Filter to only include positions with negative returns
-        df = df[df['Profit/Loss'].apply(lambda x: isinstance(x, (int, float)) and x < 0)]
-    
-    if df.empty:
-        st.info("Add stocks to your portfolio to see your performance data here.")
-    else:
-        # Portfolio summary metrics
-        st.subheader("Portfolio Summary")
-        
-        # Create metrics rows
-        metric_col1, metric_col2, metric_col3 = st.columns(3)
-        
-        with metric_col1:
-            st.metric("Total Portfolio Value", f"${total_value:.2f}")
-        
-        with metric_col2:
-            delta_color = "normal" if total_profit_loss >= 0 else "inverse"
-            st.metric("Unrealized Profit/Loss", f"${total_profit_loss:.2f}", f"{total_profit_loss_percent:.2f}%", delta_color=delta_color)
-        
-        with metric_col3:
-            st.metric("Number of Holdings", len(df))
-        
-        # Second row of metrics
-        metric2_col1, metric2_col2, metric2_col3 = st.columns(3)
-        
-        with metric2_col1:
-            st.metric("Realized Gains", f"${total_realized_gain:.2f}")
-        
-        with metric2_col2:
-            avg_return_color = "normal" if avg_return_pct >= 0 else "inverse"
-            st.metric("Average Return", f"{avg_return_pct:.2f}%", delta_color=avg_return_color)
-        
-        with metric2_col3:
-            # Count holdings by status
-            active_count = len([h for h in df.to_dict('records') if h['Status'] == 'Active'])
-            watchlist_count = len([h for h in df.to_dict('records') if h['Status'] == 'Watchlist'])
-            sold_count = len([h for h in df.to_dict('records') if h['Status'] == 'Sold'])
-            
-            status_text = f"Active: {active_count}"
-            if watchlist_count > 0:
-                status_text += f" | Watch: {watchlist_count}"
-            if sold_count > 0:
-                status_text += f" | Sold: {sold_count}"
-                
-            st.metric("Holdings by Status", status_text)
-        
-        # Show tabs for different views
-        overview_tab, allocation_tab, details_tab = st.tabs(["Overview", "Allocation", "Details"])
-        
-        with overview_tab:
-            # Show allocations by ticker
-            st.subheader("Portfolio Breakdown")
-            
-            # Create visualization based on holding status
-            df_active = df[df['Status'] == 'Active'].copy() if 'Status' in df.columns else df.copy()
-            if not df_active.empty:
-                # Create stacked bar chart showing active holdings
-                fig_breakdown = px.bar(
-                    df_active,
-                    x="Ticker",
-                    y="Current Value",
-                    color="Profit/Loss %",
-                    color_continuous_scale=[(0, "red"), (0.5, "yellow"), (1, "green")],
-                    labels={"Current Value": "Value ($)", "Ticker": "Stock Symbol"},
-                    title="Active Holdings Breakdown",
-                    hover_data=["Company", "Shares", "Purchase Price", "Current Price", "Profit/Loss"]
-                )
-                
-                fig_breakdown.update_layout(
-                    xaxis_title="Stock",
-                    yaxis_title="Value ($)",
-                    coloraxis_colorbar_title="Return %"
-                )
-                
-                st.plotly_chart(fig_breakdown, use_container_width=True)
-            else:
-                st.info("No active holdings to display.")
-        
-        with allocation_tab:
-            # View allocations by different dimensions
-            alloc_type = st.radio("Allocation View", ["By Stock", "By Sector"], horizontal=True)
-            
-            if alloc_type == "By Stock":
-                # Filter to exclude watchlist items for value allocation
-                df_value = df[df['Is Watchlist'] == False].copy() if 'Is Watchlist' in df.columns else df.copy()
-                
-                if not df_value.empty:
-                    # Create pie chart by stock
-                    fig_pie = px.pie(
-                        df_value, 
-                        values='Current Value', 
-                        names='Ticker',
-                        title="Portfolio Allocation by Stock",
-                        hover_data=['Company', 'Shares', 'Profit/Loss %', 'Status'],
-                        labels={'Current Value': 'Value ($)'}
-                    )
-                    
-                    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-                    
-                    st.plotly_chart(fig_pie, use_container_width=True)
-                else:
-                    st.info("No holdings data available for stock allocation view.")
-            else:
-                # Filter to exclude watchlist items for sector allocation
-                df_sector = df[(df['Is Watchlist'] == False) & (df['Sector'].notna())].copy() if 'Is Watchlist' in df.columns else df.copy()
-                
-                if not df_sector.empty and 'Sector' in df_sector.columns:
-                    # Group by sector
-                    sector_data = df_sector.groupby('Sector')['Current Value'].sum().reset_index()
-                    
-                    # Create pie chart by sector
-                    fig_sector = px.pie(
-                        sector_data, 
-                        values='Current Value', 
-                        names='Sector',
-                        title="Portfolio Allocation by Sector",
-                        labels={'Current Value': 'Value ($)'}
-                    )
-                    
-                    fig_sector.update_traces(textposition='inside', textinfo='percent+label')
-                    
-                    st.plotly_chart(fig_sector, use_container_width=True)
-                else:
-                    st.info("No sector data available. Add sector information to your holdings.")
-        
-        with details_tab:
-            # Select view type
-            view_type = st.radio("View Type", ["Active Holdings", "Watchlist", "Sold Positions", "All Holdings"], horizontal=True)
-            
-            if view_type == "Active Holdings":
-                display_df = df[df['Status'] == 'Active'].copy() if 'Status' in df.columns else df.copy()
-                display_cols = ['Ticker', 'Company', 'Sector', 'Shares', 'Purchase Price', 'Current Price', 
-                                'Current Value', 'Profit/Loss', 'Profit/Loss %', 'Days Held']
-            elif view_type == "Watchlist":
-                display_df = df[df['Status'] == 'Watchlist'].copy() if 'Status' in df.columns else pd.DataFrame()
-                display_cols = ['Ticker', 'Company', 'Sector', 'Shares', 'Purchase Price', 'Current Price', 
-                                'Current Value', 'Notes']
-            elif view_type == "Sold Positions":
-                display_df = df[df['Status'] == 'Sold'].copy() if 'Status' in df.columns else pd.DataFrame()
-                display_cols = ['Ticker', 'Company', 'Sector', 'Shares', 'Purchase Price', 'Sell Price', 
-                                'Realized Gain', 'Days Held', 'Sell Date']
-            else:  # All Holdings
-                display_df = df.copy()
-                display_cols = ['Ticker', 'Company', 'Status', 'Shares', 'Purchase Price', 'Current Price', 
-                                'Current Value', 'Profit/Loss', 'Profit/Loss %']
-            
-            # Filter to only include available columns
-            display_cols = [col for col in display_cols if col in display_df.columns]
-            
-            if not display_df.empty:
-                # Format the dataframe for display
-                format_df = display_df[display_cols].copy()
-                
-                # Reformat numeric columns for display
-                if 'Current Value' in format_df.columns:
-                    format_df['Current Value'] = format_df['Current Value'].apply(lambda x: f"${x:.2f}" if isinstance(x, (int, float)) else x)
-                
-                if 'Profit/Loss' in format_df.columns:
-                    format_df['Profit/Loss'] = format_df['Profit/Loss'].apply(lambda x: f"${x:.2f}" if isinstance(x, (int, float)) else x)
-                
-                if 'Realized Gain' in format_df.columns:
-                    format_df['Realized Gain'] = format_df['Realized Gain'].apply(lambda x: f"${x:.2f}" if isinstance(x, (int, float)) else x)
-                
-                st.dataframe(format_df, use_container_width=True)
-            else:
-                st.info(f"No data available for '{view_type}' view.")
-        
-        # Export options
-        st.subheader("Export Portfolio Data")
-        
-        # Convert DataFrame to CSV
-        csv = df.to_csv(index=False).encode('utf-8')
-        
-        # Download button
-        st.download_button(
-            label="Download Portfolio Data (CSV)",
-            data=csv,
-            file_name=f"portfolio_data_{datetime.now().strftime('%Y-%m-%d')}.csv",
-            mime="text/csv"
-        )
+    render_portfolio_overview(filtered_holdings)
 
 # Footer
 st.markdown("---")
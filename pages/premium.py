@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
@@ -22,6 +23,103 @@ st.set_page_config(
     layout="wide"
 )
 
+# Plan cards for the "Change Your Plan" section, built once since the plans are constants
+PLAN_CARD_HTML = {
+    plan_id: f"""
+    <div style="
+        border: 1px solid {plan['color']}; 
+        border-radius: 10px; 
+        padding: 10px; 
+        text-align: center;
+        background-color: rgba({plan['rgb'][0]}, {plan['rgb'][1]}, {plan['rgb'][2]}, 0.1);
+    ">
+        <h4>{plan['name']}</h4>
+        <p>{plan['price']}</p>
+    </div>
+    """
+    for plan_id, plan in PREMIUM_PLANS.items()
+}
+
+# Plans offered when switching away from each plan: current plan id -> [(plan_id, plan), ...]
+AVAILABLE_PLANS = {
+    current_id: [(plan_id, plan) for plan_id, plan in PREMIUM_PLANS.items() if plan_id != current_id]
+    for current_id in PREMIUM_PLANS
+}
+
+@st.cache_data(show_spinner=False)
+def get_conversion_artifacts():
+    """
+    Build the simulated conversion metrics for the analytics tab
+    
+    Returns:
+    - Tuple of (funnel figure, (avg impression rate, avg click rate, avg conversion rate))
+    """
+    # Simulated daily counts for the last 15 days
+    visitors = np.array([120, 135, 140, 130, 150, 160, 175, 185, 190, 200, 210, 205, 220, 230, 240], dtype=float)
+    impressions = np.array([80, 95, 100, 90, 110, 120, 130, 140, 145, 155, 165, 160, 175, 180, 190], dtype=float)
+    clicks = np.array([8, 10, 11, 9, 12, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23], dtype=float)
+    conversions = np.array([2, 3, 2, 2, 3, 4, 3, 4, 4, 5, 5, 6, 6, 7, 8], dtype=float)
+    
+    # Average the daily rates (each rounded to one decimal, as displayed)
+    averages = (
+        np.round(impressions / visitors * 100, 1).mean(),
+        np.round(clicks / impressions * 100, 1).mean(),
+        np.round(conversions / clicks * 100, 1).mean()
+    )
+    
+    # Plot conversion funnel
+    funnel_values = [visitors.sum(), impressions.sum(), clicks.sum(), conversions.sum()]
+    
+    funnel_labels = [
+        "Unique Visitors",
+        "Feature Impressions",
+        "Upgrade Clicks",
+        "Conversions"
+    ]
+    
+    fig = go.Figure(go.Funnel(
+        y=funnel_labels,
+        x=funnel_values,
+        textinfo="value+percent initial",
+        marker={"color": ["#4682B4", "#5F9EA0", "#6495ED", "#4169E1"]}
+    ))
+    
+    fig.update_layout(
+        title="Premium Feature Conversion Funnel",
+        height=400
+    )
+    
+    return fig, averages
+
+@st.cache_data(show_spinner=False)
+def get_feature_comparison():
+    """
+    Build the feature-by-plan comparison table
+    
+    Returns:
+    - DataFrame with one row per premium feature and a ✅/❌ column per plan
+    """
+    features = list(PREMIUM_FEATURES.values())
+    
+    # Build the table column by column
+    columns = {
+        "Feature": [f"{feature['icon']} {feature['name']}" for feature in features],
+        "Description": [feature['description'] for feature in features]
+    }
+    
+    # Add columns for each plan
+    for plan_id, plan in PREMIUM_PLANS.items():
+        columns[plan['name']] = ["✅" if plan_id in feature['plans'] else "❌" for feature in features]
+    
+    return pd.DataFrame(columns)
+
+# Sections of the premium page, in selector order
+PREMIUM_SECTIONS = ["Available Plans", "Account Management", "Feature Comparison", "Analytics"]
+
+def show_premium_section(section):
+    """Button callback that switches the premium page to another section"""
+    st.session_state.premium_section = section
+
 def main():
     st.title("⭐ Premium Features")
     
@@ -32,7 +130,7 @@ def main():
     # Display current plan info
     st.markdown(f"""
     <div style="
-        background-color: rgba({int(plan_info['color'][1:3], 16)}, {int(plan_info['color'][3:5], 16)}, {int(plan_info['color'][5:7], 16)}, 0.2);
+        background-color: rgba({plan_info['rgb'][0]}, {plan_info['rgb'][1]}, {plan_info['rgb'][2]}, 0.2);
         padding: 20px;
         border-radius: 10px;
         margin-bottom: 20px;
@@ -42,14 +140,21 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Display tabs for different sections
-    tab1, tab2, tab3, tab4 = st.tabs(["Available Plans", "Account Management", "Feature Comparison", "Analytics"])
+    # Section selector - unlike st.tabs, only the selected section's body runs on each rerun.
+    # The keyed selection survives the st.rerun() calls in Account Management.
+    section = st.radio(
+        "Go to section",
+        PREMIUM_SECTIONS,
+        index=0,
+        horizontal=True,
+        key="premium_section"
+    )
     
-    with tab1:
+    if section == "Available Plans":
         display_subscription_plans()
     
-    # Account Management Tab
-    with tab2:
+    # Account Management section
+    elif section == "Account Management":
         st.subheader("Account Management")
         
         # Get current plan information
@@ -125,24 +230,12 @@ def main():
                 st.markdown("### Change Your Plan")
                 
                 # Show only the plans different from the current one
-                available_plans = [p for p in PREMIUM_PLANS.values() if p['name'].lower() != current_plan]
+                available_plans = AVAILABLE_PLANS.get(current_plan, list(PREMIUM_PLANS.items()))
                 cols = st.columns(len(available_plans))
                 
-                for i, plan in enumerate(available_plans):
+                for i, (plan_id, plan) in enumerate(available_plans):
                     with cols[i]:
-                        plan_id = plan['name'].lower()
-                        st.markdown(f"""
-                        <div style="
-                            border: 1px solid {plan['color']}; 
-                            border-radius: 10px; 
-                            padding: 10px; 
-                            text-align: center;
-                            background-color: rgba({int(plan['color'][1:3], 16)}, {int(plan['color'][3:5], 16)}, {int(plan['color'][5:7], 16)}, 0.1);
-                        ">
-                            <h4>{plan['name']}</h4>
-                            <p>{plan['price']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                        st.markdown(PLAN_CARD_HTML[plan_id], unsafe_allow_html=True)
                         
                         if st.button(f"Switch to {plan['name']}", key=f"switch_{plan_id}"):
                             # Change the plan
@@ -165,9 +258,8 @@ def main():
             # For free plan, show upgrade prompt
             st.info("You are currently on the Free plan. Upgrade to a premium plan to access exclusive features!")
             
-            if st.button("Upgrade Now"):
-                st.session_state['active_tab'] = 0  # Switch to Available Plans tab
-                st.rerun()
+            # Switch to the Available Plans section (set in a callback, before the radio is drawn)
+            st.button("Upgrade Now", on_click=show_premium_section, args=("Available Plans",))
         
         # Data privacy section
         st.markdown("---")
@@ -191,25 +283,10 @@ def main():
             reset_test_plan()
             st.rerun()
     
-    with tab3:
+    elif section == "Feature Comparison":
         st.subheader("Feature Comparison")
         
-        # Create a feature comparison table
-        feature_comparison = []
-        for feature_id, feature in PREMIUM_FEATURES.items():
-            row = {
-                "Feature": f"{feature['icon']} {feature['name']}",
-                "Description": feature['description']
-            }
-            
-            # Add columns for each plan
-            for plan_id, plan in PREMIUM_PLANS.items():
-                row[plan['name']] = "✅" if plan_id in feature['plans'] else "❌"
-            
-            feature_comparison.append(row)
-        
-        # Convert to DataFrame and display
-        comparison_df = pd.DataFrame(feature_comparison)
+        comparison_df = get_feature_comparison()
         st.dataframe(comparison_df, use_container_width=True, hide_index=True)
         
         # Feature details
@@ -226,7 +303,7 @@ def main():
                 # Add a simulated screenshot or example
                 st.info("Feature preview would appear here in a production app")
     
-    with tab4:
+    elif section == "Analytics":
         st.subheader("Premium Features Analytics")
         st.write("This data helps us understand which features are most valuable to users.")
         
@@ -236,66 +313,21 @@ def main():
         # Add some simulated conversion data
         st.subheader("Conversion Metrics")
         
-        # Create simulated conversion data
-        conversion_data = {
-            "Date": [
-                (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d") 
-                for i in range(14, -1, -1)
-            ],
-            "Unique Visitors": [120, 135, 140, 130, 150, 160, 175, 185, 190, 200, 210, 205, 220, 230, 240],
-            "Feature Impressions": [80, 95, 100, 90, 110, 120, 130, 140, 145, 155, 165, 160, 175, 180, 190],
-            "Upgrade Clicks": [8, 10, 11, 9, 12, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23],
-            "Conversions": [2, 3, 2, 2, 3, 4, 3, 4, 4, 5, 5, 6, 6, 7, 8]
-        }
-        
-        # Calculate rates
-        conv_df = pd.DataFrame(conversion_data)
-        conv_df["Impression Rate"] = (conv_df["Feature Impressions"] / conv_df["Unique Visitors"] * 100).round(1)
-        conv_df["Click Rate"] = (conv_df["Upgrade Clicks"] / conv_df["Feature Impressions"] * 100).round(1)
-        conv_df["Conversion Rate"] = (conv_df["Conversions"] / conv_df["Upgrade Clicks"] * 100).round(1)
+        # Simulated metrics are constant, so they're built once and cached
+        fig, (avg_imp_rate, avg_click_rate, avg_conv_rate) = get_conversion_artifacts()
         
         # Display the metrics in columns
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            avg_imp_rate = conv_df["Impression Rate"].mean()
             st.metric("Avg. Impression Rate", f"{avg_imp_rate:.1f}%")
         
         with col2:
-            avg_click_rate = conv_df["Click Rate"].mean()
             st.metric("Avg. Click Rate", f"{avg_click_rate:.1f}%")
         
         with col3:
-            avg_conv_rate = conv_df["Conversion Rate"].mean()
             st.metric("Avg. Conversion Rate", f"{avg_conv_rate:.1f}%")
         
-        # Plot conversion funnel
-        funnel_values = [
-            conv_df["Unique Visitors"].sum(),
-            conv_df["Feature Impressions"].sum(),
-            conv_df["Upgrade Clicks"].sum(),
-            conv_df["Conversions"].sum()
-        ]
-        
-        funnel_labels = [
-            "Unique Visitors",
-            "Feature Impressions",
-            "Upgrade Clicks",
-            "Conversions"
-        ]
-        
-        fig = go.Figure(go.Funnel(
-            y=funnel_labels,
-            x=funnel_values,
-            textinfo="value+percent initial",
-            marker={"color": ["#4682B4", "#5F9EA0", "#6495ED", "#4169E1"]}
-        ))
-        
-        fig.update_layout(
-            title="Premium Feature Conversion Funnel",
-            height=400
-        )
-        
         st.plotly_chart(fig, use_container_width=True)
         
         # Disclaimer about simulated data
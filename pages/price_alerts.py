@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
+import numpy as np
 import database as db
+from market_data import fetch_current_prices, get_quote
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Set page config
@@ -16,6 +18,9 @@ st.set_page_config(
 st.title("🔔 Price Alerts")
 st.markdown("Set up alerts to get notified when stocks hit your target prices")
 
+# Column format for dollar prices in the alert tables
+PRICE_COLUMN = st.column_config.NumberColumn(format="$%.2f")
+
 # Initialize session state variables
 if 'alerts_data' not in st.session_state:
     st.session_state.alerts_data = None
@@ -27,64 +32,157 @@ if 'alert_type' not in st.session_state:
     st.session_state.alert_type = None
 if 'notification_history' not in st.session_state:
     st.session_state.notification_history = []
+if 'alerts_version' not in st.session_state:
+    st.session_state.alerts_version = 0
+
+def alerts_to_frame(alerts):
+    """Build a DataFrame straight from sqlite3 rows, taking the column names from the query"""
+    if not alerts:
+        return pd.DataFrame()
+    return pd.DataFrame.from_records(alerts, columns=list(alerts[0].keys()))
+
+@st.cache_data(ttl=5, show_spinner=False)
+def get_active_alerts(alerts_version):
+    """
+    Get the active price alerts as a DataFrame, cached briefly across reruns
+    
+    Parameters:
+    - alerts_version: Counter bumped whenever alerts are added, triggered or deleted; part of the cache key
+    """
+    return alerts_to_frame(db.get_price_alerts(active_only=True))
+
+def fetch_prices(tickers):
+    """
+    Fetch current prices for several tickers
+    
+    Parameters:
+    - tickers: Collection of unique ticker symbols
+    
+    Returns:
+    - Tuple of (dict mapping ticker to price, dict mapping ticker to the error for failed lookups)
+    """
+    tickers = sorted(tickers)
+    errors = {}
+    if not tickers:
+        return {}, errors
+    
+    # One batched download covers most tickers
+    prices = fetch_current_prices(tickers)
+    tickers = [ticker for ticker in tickers if ticker not in prices]
+    if not tickers:
+        return prices, errors
+    
+    # Tickers missing from the batch fall back to per-ticker lookups; each is a
+    # blocking HTTP request, so run them side by side
+    with ThreadPoolExecutor(max_workers=min(16, len(tickers))) as executor:
+        futures = [executor.submit(get_quote, ticker) for ticker in tickers]
+    
+    for ticker, future in zip(tickers, futures):
+        try:
+            prices[ticker] = future.result()['price'] or 0
+        except Exception as e:
+            errors[ticker] = e
+    
+    return prices, errors
 
 # Function to check if any alerts have been triggered
 def check_price_alerts():
-    # Get all pending alerts
-    pending_alerts = db.get_pending_alerts()
+    # Get unique tickers with pending alerts
+    tickers = db.get_pending_alert_tickers()
     
-    if not pending_alerts:
+    if not tickers:
         return []
     
-    # Get unique tickers to check
-    tickers = set([alert['ticker'] for alert in pending_alerts])
-    
     # Fetch current prices
-    current_prices = {}
-    triggered_alerts = []
+    current_prices, errors = fetch_prices(tickers)
     
-    for ticker in tickers:
-        try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-            current_prices[ticker] = current_price
-        except Exception as e:
-            # Skip this ticker on error
-            st.error(f"Error fetching data for {ticker}: {str(e)}")
-            continue
+    # Tickers that failed are skipped
+    for ticker, e in errors.items():
+        st.error(f"Error fetching data for {ticker}: {str(e)}")
     
-    # Check each alert against current price
-    for alert in pending_alerts:
-        ticker = alert['ticker']
-        if ticker not in current_prices:
-            continue
-            
-        current_price = current_prices[ticker]
-        target_price = alert['target_price']
-        is_above = alert['is_above'] == 1
-        
-        # Check if the alert is triggered
-        if (is_above and current_price >= target_price) or (not is_above and current_price <= target_price):
-            # Mark as triggered in the database
-            db.mark_alert_triggered(alert['id'])
-            
-            # Add to triggered list
-            alert_dict = dict(alert)
-            alert_dict['current_price'] = current_price
-            triggered_alerts.append(alert_dict)
-            
-            # Add to notification history for in-app display
-            direction = "above" if is_above else "below"
-            message = f"Price Alert: {ticker} is now ${current_price:.2f}, {direction} your target of ${target_price:.2f}"
-            st.session_state.notification_history.append({
-                'ticker': ticker,
-                'message': message,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            })
+    # Compare every pending alert against the prices and mark the triggered ones in one transaction
+    triggered_alerts = db.trigger_alerts_at_prices(current_prices)
+    
+    # Add to notification history for in-app display
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for alert in triggered_alerts:
+        direction = "above" if alert['is_above'] == 1 else "below"
+        message = f"Price Alert: {alert['ticker']} is now ${alert['current_price']:.2f}, {direction} your target of ${alert['target_price']:.2f}"
+        st.session_state.notification_history.append({
+            'ticker': alert['ticker'],
+            'message': message,
+            'timestamp': timestamp
+        })
     
     return triggered_alerts
 
+@st.fragment
+def new_alert_form(ticker):
+    """
+    Show the current price and the alert settings form for a ticker
+    
+    Runs as a fragment, so editing the target price, direction or notes only
+    reruns this form instead of the whole page.
+    """
+    # Fetch current price
+    try:
+        quote = get_quote(ticker)
+        current_price = quote['price'] or 0
+        company_name = quote['name']
+        
+        # Display current price and company info
+        st.metric(f"{company_name} ({ticker})", f"${current_price:.2f}")
+        
+        # Set the target price
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            target_price = st.number_input("Target Price ($)", 
+                                         min_value=0.01, 
+                                         value=round(current_price, 2),
+                                         step=0.01,
+                                         format="%.2f")
+        
+        with col2:
+            # Calculate difference from current price
+            diff_pct = ((target_price - current_price) / current_price) * 100
+            st.metric("Difference from current", f"{diff_pct:.2f}%", delta=f"{diff_pct:.2f}%")
+        
+        # Set alert type (above or below)
+        is_above = st.radio("Alert me when price goes:", 
+                          ["Above target", "Below target"],
+                          index=0 if target_price > current_price else 1)
+        
+        is_above_value = 1 if is_above == "Above target" else 0
+        
+        # Notification options
+        st.subheader("Notification Options")
+        
+        st.info("Price alerts will appear in the app dashboard when triggered.")
+        
+        # Add notes field
+        notes = st.text_area("Add notes (optional)", "", max_chars=200, 
+                           help="Add any notes about this alert for your reference")
+        
+        # Submit button
+        if st.button("Create Alert"):
+            # Add the alert to the database
+            alert_id = db.add_price_alert(
+                ticker=ticker,
+                target_price=target_price,
+                is_above=is_above_value,
+                phone_number=None,
+                email=None
+            )
+            
+            if alert_id:
+                st.session_state.alerts_version += 1
+                st.success(f"Alert created successfully! You'll be notified when {ticker} goes {'above' if is_above_value else 'below'} ${target_price:.2f}")
+            else:
+                st.error("Failed to create alert. Please try again.")
+    except Exception as e:
+        st.error(f"Error fetching data for {ticker}: {str(e)}")
+
 # Create tabs
 tabs = st.tabs(["Current Alerts", "Set New Alert", "Triggered Alerts"])
 
@@ -99,6 +197,7 @@ with tabs[0]:
             with st.spinner("Checking current prices..."):
                 triggered = check_price_alerts()
                 st.session_state.last_price_check = time.time()
+                st.session_state.alerts_version += 1
                 if triggered:
                     st.session_state.alert_message = f"🔔 {len(triggered)} alert(s) triggered!"
                     st.session_state.alert_type = "success"
@@ -123,46 +222,55 @@ with tabs[0]:
             st.error(st.session_state.alert_message)
     
     # Get current alerts
-    current_alerts = db.get_price_alerts(active_only=True)
+    current_alerts = get_active_alerts(st.session_state.alerts_version)
     
-    if current_alerts:
-        # Convert to DataFrame
-        alerts_df = pd.DataFrame(current_alerts)
-        
-        # Fetch current prices for comparison
-        tickers = set(alerts_df['ticker'])
-        current_prices = {}
+    if not current_alerts.empty:
+        # Reuse the table built on an earlier rerun unless the alerts changed or
+        # "Check Alerts Now" was clicked since
+        alerts_key = (tuple(current_alerts['id']), st.session_state.last_price_check)
+        cached = st.session_state.alerts_data
         
-        for ticker in tickers:
-            try:
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-                current_prices[ticker] = current_price
-            except:
-                current_prices[ticker] = 0
-        
-        # Add current price to DataFrame
-        alerts_df['current_price'] = alerts_df['ticker'].map(current_prices)
-        
-        # Add human readable columns
-        alerts_df['direction'] = alerts_df['is_above'].apply(lambda x: "Above ↑" if x == 1 else "Below ↓")
-        alerts_df['distance'] = ((alerts_df['current_price'] - alerts_df['target_price']) / alerts_df['target_price'] * 100).round(2)
-        alerts_df['distance_str'] = alerts_df.apply(
-            lambda row: f"{abs(row['distance']):.2f}% {'away' if (row['is_above'] == 1 and row['current_price'] < row['target_price']) or (row['is_above'] == 0 and row['current_price'] > row['target_price']) else 'TRIGGERED'}", 
-            axis=1
-        )
-        
-        # Format the DataFrame for display
-        display_df = alerts_df[['ticker', 'target_price', 'direction', 'current_price', 'distance_str', 'date_created']]
-        display_df.columns = ['Ticker', 'Target Price', 'Direction', 'Current Price', 'Status', 'Date Created']
+        if cached is not None and cached['key'] == alerts_key:
+            display_df = cached['data']
+        else:
+            # cache_data hands back a fresh copy, so columns can be added in place
+            alerts_df = current_alerts
+            
+            # Fetch current prices for comparison
+            current_prices, errors = fetch_prices(set(alerts_df['ticker']))
+            current_prices.update(dict.fromkeys(errors, 0))
+            
+            # Add current price to DataFrame
+            alerts_df['current_price'] = alerts_df['ticker'].map(current_prices)
+            
+            # Add human readable columns, computed column-wise
+            is_above = alerts_df['is_above'].eq(1).to_numpy()
+            current = alerts_df['current_price'].to_numpy(dtype=float)
+            target = alerts_df['target_price'].to_numpy(dtype=float)
+            distance = (current - target) / target * 100
+            triggered = np.where(is_above, current >= target, current <= target)
+            
+            alerts_df['direction'] = np.where(is_above, "Above ↑", "Below ↓")
+            alerts_df['distance'] = distance.round(2)
+            alerts_df['distance_str'] = np.char.add(
+                np.char.mod('%.2f%% ', np.abs(distance.round(2))),
+                np.where(triggered, 'TRIGGERED', 'away')
+            )
+            
+            # Drop fractional seconds from the timestamps in one vectorized pass
+            alerts_df['date_created'] = alerts_df['date_created'].astype(str).str.split('.').str[0]
+            
+            # Format the DataFrame for display
+            display_df = alerts_df[['ticker', 'target_price', 'direction', 'current_price', 'distance_str', 'date_created']]
+            display_df.columns = ['Ticker', 'Target Price', 'Direction', 'Current Price', 'Status', 'Date Created']
+            
+            st.session_state.alerts_data = {'key': alerts_key, 'data': display_df}
         
-        # Display the alerts table
-        st.dataframe(display_df.style.format({
-            'Target Price': '${:.2f}',
-            'Current Price': '${:.2f}',
-            'Date Created': lambda x: x.split('.')[0] if '.' in x else x
-        }), use_container_width=True)
+        # Display the alerts table (currency formatting is applied client-side)
+        st.dataframe(display_df, column_config={
+            'Target Price': PRICE_COLUMN,
+            'Current Price': PRICE_COLUMN
+        }, use_container_width=True, hide_index=True)
         
         # Add option to delete alerts
         if st.button("Delete Selected Alerts"):
@@ -207,64 +315,7 @@ with tabs[1]:
             ticker = st.text_input("Enter ticker symbol (no portfolio or favorite stocks found)", default_ticker).upper()
     
     if ticker:
-        # Fetch current price
-        try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
-            company_name = info.get('shortName', ticker)
-            
-            # Display current price and company info
-            st.metric(f"{company_name} ({ticker})", f"${current_price:.2f}")
-            
-            # Set the target price
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                target_price = st.number_input("Target Price ($)", 
-                                             min_value=0.01, 
-                                             value=round(current_price, 2),
-                                             step=0.01,
-                                             format="%.2f")
-            
-            with col2:
-                # Calculate difference from current price
-                diff_pct = ((target_price - current_price) / current_price) * 100
-                st.metric("Difference from current", f"{diff_pct:.2f}%", delta=f"{diff_pct:.2f}%")
-            
-            # Set alert type (above or below)
-            is_above = st.radio("Alert me when price goes:", 
-                              ["Above target", "Below target"],
-                              index=0 if target_price > current_price else 1)
-            
-            is_above_value = 1 if is_above == "Above target" else 0
-            
-            # Notification options
-            st.subheader("Notification Options")
-            
-            st.info("Price alerts will appear in the app dashboard when triggered.")
-            
-            # Add notes field
-            notes = st.text_area("Add notes (optional)", "", max_chars=200, 
-                               help="Add any notes about this alert for your reference")
-            
-            # Submit button
-            if st.button("Create Alert"):
-                # Add the alert to the database
-                alert_id = db.add_price_alert(
-                    ticker=ticker,
-                    target_price=target_price,
-                    is_above=is_above_value,
-                    phone_number=None,
-                    email=None
-                )
-                
-                if alert_id:
-                    st.success(f"Alert created successfully! You'll be notified when {ticker} goes {'above' if is_above_value else 'below'} ${target_price:.2f}")
-                else:
-                    st.error("Failed to create alert. Please try again.")
-        except Exception as e:
-            st.error(f"Error fetching data for {ticker}: {str(e)}")
+        new_alert_form(ticker)
 
 # Tab 3: Triggered Alerts History
 with tabs[2]:
@@ -275,32 +326,34 @@ with tabs[2]:
     
     with col1:
         st.markdown("### From Database")
-        # Get all triggered alerts
-        triggered_alerts = db.get_price_alerts(active_only=False)
-        triggered_alerts = [alert for alert in triggered_alerts if alert['is_triggered'] == 1]
+        # Get the triggered alerts (filtered in SQL)
+        triggered_alerts = db.get_triggered_alerts()
         
         if triggered_alerts:
             # Convert to DataFrame
-            alerts_df = pd.DataFrame(triggered_alerts)
+            alerts_df = alerts_to_frame(triggered_alerts)
             
             # Add human readable columns
             alerts_df['direction'] = alerts_df['is_above'].apply(lambda x: "Above ↑" if x == 1 else "Below ↓")
             
+            # Drop fractional seconds from the timestamps in one vectorized pass
+            for column in ('date_created', 'date_triggered'):
+                alerts_df[column] = alerts_df[column].fillna('').astype(str).str.split('.').str[0]
+            
             # Format the DataFrame for display
             display_df = alerts_df[['ticker', 'target_price', 'direction', 'date_created', 'date_triggered']]
             display_df.columns = ['Ticker', 'Target Price', 'Direction', 'Date Created', 'Date Triggered']
             
-            # Display the alerts table
-            st.dataframe(display_df.style.format({
-                'Target Price': '${:.2f}',
-                'Date Created': lambda x: x.split('.')[0] if '.' in x else x,
-                'Date Triggered': lambda x: x.split('.')[0] if '.' in x and x is not None else x
-            }), use_container_width=True)
+            # Display the alerts table (currency formatting is applied client-side)
+            st.dataframe(display_df, column_config={
+                'Target Price': PRICE_COLUMN
+            }, use_container_width=True, hide_index=True)
             
             # Button to clear database history
             if st.button("Clear DB History"):
                 with st.spinner("Clearing triggered alerts..."):
                     deleted_count = db.delete_all_triggered_alerts()
+                    st.session_state.alerts_version += 1
                     st.success(f"Cleared {deleted_count} triggered alerts from the database")
                     st.rerun()
         else:
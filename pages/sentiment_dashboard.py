@@ -1,20 +1,13 @@
 import streamlit as st
-import pandas as pd
 import yfinance as yf
 import plotly.graph_objects as go
-import plotly.express as px
-import numpy as np
-import os
-import sys
-import json
-from datetime import datetime, timedelta
-import requests
-from io import BytesIO
-import base64
+import html
+from datetime import datetime
 
 # Import local modules
 from database import add_search_history, get_favorite_stocks, get_search_history
-from ai_utils import generate_market_sentiment_analysis, analyze_news_sentiment
+from market_data import get_quote
+from ai_utils import analyze_news_sentiment
 from monetization import is_feature_available, display_feature_teaser
 from gamification import track_sentiment_check
 
@@ -25,55 +18,64 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_data(ttl=300, show_spinner=False)
+def load_ticker_news(ticker, max_news=10):
+    """
+    Load and process the latest Yahoo Finance news for a ticker, cached for 5 minutes
+    
+    Errors propagate so that failed lookups are not cached.
+    """
+    # Get stock info and news
+    stock = yf.Ticker(ticker)
+    news = stock.news
+    
+    # No news for this ticker
+    if not news:
+        return []
+    
+    # Process the first max_news items; publish times are formatted as 'YYYY-MM-DD HH:MM'
+    return [
+        {
+            'title': item.get('title', 'No title'),
+            'publisher': item.get('publisher', 'Unknown'),
+            'link': item.get('link', '#'),
+            'publish_time': datetime.fromtimestamp(item['providerPublishTime']).isoformat(' ', 'minutes') if 'providerPublishTime' in item else "Unknown",
+            'type': item.get('type', 'STORY'),
+            'thumbnail': (item.get('thumbnail') or {}).get('resolutions', [{}])[0].get('url', '')
+        }
+        for item in news[:max_news]
+    ]
+
 # Function to fetch news for a ticker
 def fetch_ticker_news(ticker, max_news=10):
     """
     Fetch latest news for a specific ticker using Yahoo Finance
     """
     try:
-        # Get stock info and news
-        stock = yf.Ticker(ticker)
-        news = stock.news
-        
-        # Process and return the news items
-        if news:
-            # Limit to max_news items
-            news = news[:max_news]
-            
-            # Process each news item
-            processed_news = []
-            for item in news:
-                # Extract and format the publish time
-                if 'providerPublishTime' in item:
-                    publish_time = datetime.fromtimestamp(item['providerPublishTime'])
-                    formatted_time = publish_time.strftime('%Y-%m-%d %H:%M')
-                else:
-                    formatted_time = "Unknown"
-                
-                # Create processed news item
-                processed_item = {
-                    'title': item.get('title', 'No title'),
-                    'publisher': item.get('publisher', 'Unknown'),
-                    'link': item.get('link', '#'),
-                    'publish_time': formatted_time,
-                    'type': item.get('type', 'STORY'),
-                    'thumbnail': item.get('thumbnail', {}).get('resolutions', [{}])[0].get('url', '') if 'thumbnail' in item else ''
-                }
-                processed_news.append(processed_item)
-                
-            return processed_news
-        else:
-            return []
+        return load_ticker_news(ticker, max_news)
     except Exception as e:
         st.error(f"Error fetching news for {ticker}: {e}")
         return []
 
-# Note: analyze_news_sentiment is imported from ai_utils.py
+@st.cache_data(ttl=1800, show_spinner=False)
+def get_news_sentiment(ticker, headlines, _news_items):
+    """
+    Analyze news sentiment with analyze_news_sentiment from ai_utils.py, cached for 30 minutes
+    
+    Parameters:
+    - ticker: Stock ticker the news belongs to
+    - headlines: Tuple of the news headlines; with the ticker, this is the cache key
+    - _news_items: The news items themselves (not hashed)
+    """
+    return analyze_news_sentiment(_news_items)
 
 # Function to display sentiment meter
+@st.cache_resource(max_entries=64, show_spinner=False)
 def display_sentiment_meter(sentiment_score):
     """
     Display a sentiment meter gauge chart based on the sentiment score
+    
+    The figure is built once per score and shared across reruns.
     """
     # Create the gauge chart
     fig = go.Figure(go.Indicator(
@@ -109,9 +111,12 @@ def display_sentiment_meter(sentiment_score):
     return fig
 
 # Function to display sentiment distribution
+@st.cache_resource(max_entries=64, show_spinner=False)
 def display_sentiment_distribution(distribution):
     """
     Display a pie chart showing the distribution of sentiment across news articles
+    
+    The figure is built once per distribution and shared across reruns.
     """
     # Prepare data
     labels = list(distribution.keys())
@@ -161,49 +166,44 @@ def display_news_with_sentiment(news_items):
         'bearish': '📉'
     }
     
-    # Display each news item
+    # Build the whole feed as one HTML block so it is sent as a single element;
+    # text from the news source is escaped before it goes into the markup
+    cards = []
     for i, item in enumerate(news_items):
         # Get sentiment if available, default to neutral
         sentiment = item.get('sentiment', 'neutral')
-        sentiment_score = item.get('sentiment_score', 0.5)
         reasoning = item.get('reasoning', '')
         
-        # Create a card-like container for each news item
-        with st.container():
-            # Add a separator for all but the first item
-            if i > 0:
-                st.markdown("---")
-            
-            # Layout: Title row with sentiment indicator
-            cols = st.columns([7, 1])
-            
-            with cols[0]:
-                st.markdown(f"### [{item['title']}]({item['link']})")
-                st.caption(f"{item['publisher']} • {item['publish_time']}")
-            
-            with cols[1]:
-                st.markdown(f"""
-                <div style="
-                    background-color: {sentiment_colors.get(sentiment, '#FFCC29')};
-                    color: white;
-                    text-align: center;
-                    padding: 5px;
-                    border-radius: 5px;
-                    font-weight: bold;
-                    margin-top: 15px;
-                ">
-                    {sentiment_icons.get(sentiment, '➖')} {sentiment.capitalize()}
-                </div>
-                """, unsafe_allow_html=True)
-            
-            # Display reasoning if available
-            if reasoning:
-                with st.expander("Analysis"):
-                    st.markdown(f"*{reasoning}*")
-            
-            # Display thumbnail if available
-            if item.get('thumbnail'):
-                st.image(item['thumbnail'], width=200)
+        # Add a separator for all but the first item
+        separator = '<hr>' if i > 0 else ''
+        
+        # Display reasoning if available, in a collapsible section
+        analysis = (
+            f'<details><summary>Analysis</summary><p><em>{html.escape(reasoning)}</em></p></details>'
+            if reasoning else ''
+        )
+        
+        # Display thumbnail if available
+        thumbnail = f'<img src="{html.escape(item["thumbnail"])}" width="200">' if item.get('thumbnail') else ''
+        
+        # Title row with sentiment indicator
+        cards.append(
+            f'{separator}'
+            f'<div style="display: flex; justify-content: space-between; align-items: flex-start; gap: 1rem;">'
+            f'<div>'
+            f'<h3><a href="{html.escape(item["link"])}" target="_blank">{html.escape(item["title"])}</a></h3>'
+            f'<p style="color: gray; font-size: 0.85em;">{html.escape(item["publisher"])} • {html.escape(item["publish_time"])}</p>'
+            f'</div>'
+            f'<div style="background-color: {sentiment_colors.get(sentiment, "#FFCC29")}; color: white; text-align: center; '
+            f'padding: 5px 10px; border-radius: 5px; font-weight: bold; margin-top: 15px; white-space: nowrap;">'
+            f'{sentiment_icons.get(sentiment, "➖")} {html.escape(sentiment.capitalize())}'
+            f'</div>'
+            f'</div>'
+            f'{analysis}'
+            f'{thumbnail}'
+        )
+    
+    st.markdown(''.join(cards), unsafe_allow_html=True)
 
 # Main function
 def main():
@@ -252,12 +252,11 @@ def main():
         
         # Display stock information
         try:
-            # Get basic stock info
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            # Get basic stock info (shared, cached quote)
+            quote = get_quote(ticker)
             
             # Check if valid ticker
-            if 'longName' not in info:
+            if not quote['long_name']:
                 st.error(f"Invalid ticker symbol: {ticker}")
                 return
             
@@ -265,13 +264,13 @@ def main():
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                st.header(f"{info.get('longName', ticker)} ({ticker})")
-                st.subheader(f"{info.get('sector', 'N/A')} | {info.get('industry', 'N/A')}")
+                st.header(f"{quote['long_name']} ({ticker})")
+                st.subheader(f"{quote['sector'] or 'N/A'} | {quote['industry'] or 'N/A'}")
             
             with col2:
-                current_price = info.get('currentPrice', info.get('regularMarketPrice', 'N/A'))
+                current_price = quote['price'] if quote['price'] is not None else 'N/A'
                 if isinstance(current_price, (int, float)):
-                    price_change = info.get('regularMarketChangePercent', 0) * 100
+                    price_change = (quote['change_pct'] or 0) * 100
                     price_color = 'green' if price_change >= 0 else 'red'
                     st.markdown(f"""
                     <div style="text-align: right;">
@@ -295,7 +294,13 @@ def main():
                     track_sentiment_check(ticker)
                     
                     # Basic sentiment analysis (for all plans)
-                    sentiment_analysis = analyze_news_sentiment(news_items)
+                    # Unchanged headlines reuse the earlier analysis instead of a new API call
+                    headlines = tuple(item['title'] for item in news_items)
+                    sentiment_analysis = get_news_sentiment(ticker, headlines, news_items)
+                    
+                    # A failed analysis comes back without per-article sentiment; don't keep it cached
+                    if not any('sentiment' in article for article in sentiment_analysis.get('articles', [])):
+                        get_news_sentiment.clear(ticker, headlines, news_items)
                     
                     # Check if user has access to advanced sentiment analysis
                     has_advanced_sentiment = is_feature_available('advanced_sentiment')
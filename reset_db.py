@@ -4,33 +4,61 @@ import os
 # Ensure the data directory exists
 os.makedirs('data', exist_ok=True)
 
+# Columns of the portfolio_holdings table and their definitions (after the id column)
+PORTFOLIO_HOLDINGS_COLUMNS = {
+    'ticker': 'TEXT NOT NULL',
+    'company_name': 'TEXT',
+    'shares': 'REAL NOT NULL',
+    'purchase_price': 'REAL',
+    'purchase_date': 'TEXT',
+    'sell_price': 'REAL',
+    'sell_date': 'TEXT',
+    'is_watchlist': 'INTEGER DEFAULT 0',
+    'sector': 'TEXT',
+    'notes': 'TEXT',
+    'date_added': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+}
+
+# Definitions used when adding a column to an existing table: SQLite's ALTER TABLE
+# can't add NOT NULL columns without a default or columns with a non-constant default
+ADDED_COLUMN_DEFINITIONS = {
+    'ticker': "TEXT NOT NULL DEFAULT ''",
+    'shares': 'REAL NOT NULL DEFAULT 0',
+    'date_added': 'TIMESTAMP'
+}
+
 # Connect to the database
 conn = sqlite3.connect('data/stock_dashboard.db')
 cursor = conn.cursor()
 
-# Drop the portfolio_holdings table if it exists
-cursor.execute("DROP TABLE IF EXISTS portfolio_holdings")
-
-# Create the portfolio_holdings table with the full schema
-cursor.execute('''
-CREATE TABLE portfolio_holdings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    ticker TEXT NOT NULL,
-    company_name TEXT,
-    shares REAL NOT NULL,
-    purchase_price REAL,
-    purchase_date TEXT,
-    sell_price REAL,
-    sell_date TEXT,
-    is_watchlist INTEGER DEFAULT 0,
-    sector TEXT,
-    notes TEXT,
-    date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-''')
-
-# Commit changes and close the connection
-conn.commit()
-conn.close()
-
-print("Portfolio holdings table has been reset with the correct schema.")
\ No newline at end of file
+try:
+    cursor.execute('BEGIN')
+
+    # Create the portfolio_holdings table with the full schema if it doesn't exist
+    column_definitions = ',\n    '.join(f"{name} {definition}" for name, definition in PORTFOLIO_HOLDINGS_COLUMNS.items())
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS portfolio_holdings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {column_definitions}
+    )
+    ''')
+
+    # Add any columns missing from an older schema, keeping the existing rows
+    existing_columns = {row[1] for row in cursor.execute('PRAGMA table_info(portfolio_holdings)')}
+    added_columns = [name for name in PORTFOLIO_HOLDINGS_COLUMNS if name not in existing_columns]
+    for name in added_columns:
+        definition = ADDED_COLUMN_DEFINITIONS.get(name, PORTFOLIO_HOLDINGS_COLUMNS[name])
+        cursor.execute(f"ALTER TABLE portfolio_holdings ADD COLUMN {name} {definition}")
+
+    # Commit changes
+    conn.commit()
+except Exception:
+    conn.rollback()
+    raise
+finally:
+    conn.close()
+
+if added_columns:
+    print(f"Portfolio holdings table migrated; added columns: {', '.join(added_columns)}")
+else:
+    print("Portfolio holdings table schema is up to date.")
@@ -1,8 +1,7 @@
 import streamlit as st
 import os
-import toml
+import re
 import json
-from monetization import is_feature_available
 
 # Define our themes
 THEMES = {
@@ -53,14 +52,42 @@ THEMES = {
     }
 }
 
+# Themes offered to every user, and to users with the custom_themes feature
+FREE_THEME_KEYS = ("light", "dark", "investor")
+PREMIUM_THEME_KEYS = FREE_THEME_KEYS + ("premium_gold", "premium_blue")
+
+# Radio labels for each tier, and the reverse lookup from label to theme key
+FREE_THEME_LABELS = tuple(THEMES[key]["name"] for key in FREE_THEME_KEYS)
+PREMIUM_THEME_LABELS = tuple(THEMES[key]["name"] for key in PREMIUM_THEME_KEYS)
+THEME_KEY_BY_LABEL = {THEMES[key]["name"]: key for key in PREMIUM_THEME_KEYS}
+
+# Position of each theme in the radio (the free themes come first in both tiers)
+THEME_POSITION = {key: i for i, key in enumerate(PREMIUM_THEME_KEYS)}
+
 # Path to the Streamlit config file
 CONFIG_PATH = ".streamlit/config.toml"
 
+# Config written when no config file exists yet (the theme section is appended to it)
+DEFAULT_CONFIG = """[server]
+headless = true
+address = "0.0.0.0"
+port = 5000
+"""
+
+# Theme keys written to the [theme] section of the config file
+THEME_CONFIG_KEYS = ("base", "primaryColor", "backgroundColor", "secondaryBackgroundColor", "textColor", "font")
+
+# Matches an existing [theme] section up to the next table header or the end of the file
+THEME_SECTION_PATTERN = re.compile(r'^\[theme\][^\n]*\n.*?(?=^\[|\Z)', re.MULTILINE | re.DOTALL)
+
+def format_theme_section(theme):
+    """Format a theme as a TOML [theme] section"""
+    # JSON string literals are valid TOML basic strings
+    return "[theme]\n" + "".join(f"{key} = {json.dumps(theme[key])}\n" for key in THEME_CONFIG_KEYS)
+
 def get_current_theme():
     """Get the current active theme name from session state or set default"""
-    if "current_theme" not in st.session_state:
-        st.session_state.current_theme = "light"
-    return st.session_state.current_theme
+    return st.session_state.setdefault("current_theme", "light")
 
 def set_theme(theme_name):
     """Set a new theme by name"""
@@ -69,8 +96,6 @@ def set_theme(theme_name):
     
     # Only need to update file if asked to
     if theme_name in THEMES:
-        theme = THEMES[theme_name]
-        
         # Add JavaScript to store this theme preference
         st.markdown(f"""
         <script>
@@ -91,25 +116,21 @@ def apply_theme(theme_name, update_file=False):
         try:
             # Check if config exists
             if os.path.exists(CONFIG_PATH):
-                # Load the existing config
                 with open(CONFIG_PATH, "r") as f:
-                    config = toml.load(f)
+                    current_text = f.read()
+                # Keep everything except the existing theme section
+                config_text = THEME_SECTION_PATTERN.sub("", current_text)
             else:
-                config = {"server": {"headless": True, "address": "0.0.0.0", "port": 5000}}
+                current_text = None
+                config_text = DEFAULT_CONFIG
             
-            # Update the theme section
-            config["theme"] = {
-                "base": theme["base"],
-                "primaryColor": theme["primaryColor"],
-                "backgroundColor": theme["backgroundColor"],
-                "secondaryBackgroundColor": theme["secondaryBackgroundColor"],
-                "textColor": theme["textColor"],
-                "font": theme["font"]
-            }
+            # The other settings followed by the new theme section
+            new_text = config_text.rstrip("\n") + "\n\n" + format_theme_section(theme)
             
-            # Write back to the file
-            with open(CONFIG_PATH, "w") as f:
-                toml.dump(config, f)
+            # Skip the write (and Streamlit's config reload) if nothing changed
+            if new_text != current_text:
+                with open(CONFIG_PATH, "w") as f:
+                    f.write(new_text)
             
             return True
         except Exception as e:
@@ -123,23 +144,21 @@ def display_theme_options():
     """Display theme selection options in sidebar"""
     current_theme = get_current_theme()
     
-    # Available themes for all users
-    available_themes = ["light", "dark"]
-    
-    # Add special investor theme
-    available_themes.append("investor")
-    
     # Check if premium themes are available
+    from monetization import is_feature_available
     premium_themes_available = is_feature_available("custom_themes")
     
     if premium_themes_available:
-        available_themes.extend(["premium_gold", "premium_blue"])
+        available_themes, theme_labels = PREMIUM_THEME_KEYS, PREMIUM_THEME_LABELS
+    else:
+        available_themes, theme_labels = FREE_THEME_KEYS, FREE_THEME_LABELS
     
     st.sidebar.markdown("### 🎨 Theme Options")
     
     # Display radio buttons for theme selection
-    theme_labels = [THEMES[t]["name"] for t in available_themes]
-    theme_index = available_themes.index(current_theme) if current_theme in available_themes else 0
+    theme_index = THEME_POSITION.get(current_theme, 0)
+    if theme_index >= len(available_themes):
+        theme_index = 0
     
     selected_theme_name = st.sidebar.radio(
         "Select Theme",
@@ -148,8 +167,7 @@ def display_theme_options():
     )
     
     # Figure out which theme was selected and apply it
-    selected_index = theme_labels.index(selected_theme_name)
-    new_theme = available_themes[selected_index]
+    new_theme = THEME_KEY_BY_LABEL[selected_theme_name]
     
     # If a premium theme was selected but user doesn't have access
     if new_theme in ["premium_gold", "premium_blue"] and not premium_themes_available:
@@ -168,6 +186,12 @@ def display_theme_options():
 
 def check_theme_preference():
     """Check for user theme preference in localStorage"""
+    # The preference only needs to be read once per session; a reload with the
+    # theme query parameter starts a new session and is handled then
+    if st.session_state.get("theme_preference_checked"):
+        return
+    st.session_state.theme_preference_checked = True
+    
     st.markdown("""
     <script>
     document.addEventListener('DOMContentLoaded', function() {
@@ -194,63 +218,54 @@ def check_theme_preference():
                 del params['theme']
             st.query_params.update(params)
 
-def display_custom_css():
-    """Display custom CSS based on the current theme"""
-    current_theme = get_current_theme()
-    theme = THEMES.get(current_theme, THEMES["light"])
-    
-    # Apply some custom CSS adjustments based on the theme
-    primary_color = theme["primaryColor"]
-    text_color = theme["textColor"]
-    
-    st.markdown(f"""
-    <style>
+# Theme-independent custom CSS; the theme's colors come in through CSS variables
+CUSTOM_CSS = """
     /* Custom theme adjustments */
-    .stButton button {{
+    .stButton button {
         border-radius: 20px;
         box-shadow: 0 1px 3px rgba(0,0,0,0.12), 0 1px 2px rgba(0,0,0,0.24);
         transition: all 0.3s cubic-bezier(.25,.8,.25,1);
-    }}
+    }
     
-    .stButton button:hover {{
+    .stButton button:hover {
         box-shadow: 0 3px 6px rgba(0,0,0,0.16), 0 3px 6px rgba(0,0,0,0.23);
-    }}
+    }
     
     /* Theme-specific adjustments */
-    div.stTitle h1 {{
-        color: {primary_color};
-        border-bottom: 2px solid {primary_color};
+    div.stTitle h1 {
+        color: var(--theme-primary-color);
+        border-bottom: 2px solid var(--theme-primary-color);
         padding-bottom: 10px;
-    }}
+    }
     
     /* Premium indicators */
-    .premium-badge {{
+    .premium-badge {
         display: inline-block;
-        background: linear-gradient(45deg, {primary_color}, #FFD700);
+        background: linear-gradient(45deg, var(--theme-primary-color), #FFD700);
         color: #fff;
         padding: 2px 6px;
         border-radius: 15px;
         font-size: 0.8em;
         margin-left: 5px;
         animation: glow 2s infinite alternate;
-    }}
+    }
     
-    @keyframes glow {{
-        from {{
-            box-shadow: 0 0 5px {primary_color};
-        }}
-        to {{
-            box-shadow: 0 0 10px {primary_color}, 0 0 20px gold;
-        }}
-    }}
+    @keyframes glow {
+        from {
+            box-shadow: 0 0 5px var(--theme-primary-color);
+        }
+        to {
+            box-shadow: 0 0 10px var(--theme-primary-color), 0 0 20px gold;
+        }
+    }
     
     /* Tooltip styles */
-    .tooltip {{
+    .tooltip {
         position: relative;
         display: inline-block;
-    }}
+    }
     
-    .tooltip .tooltiptext {{
+    .tooltip .tooltiptext {
         visibility: hidden;
         background-color: #333;
         color: #fff;
@@ -265,11 +280,31 @@ def display_custom_css():
         opacity: 0;
         transition: opacity 0.3s;
         width: 200px;
-    }}
+    }
     
-    .tooltip:hover .tooltiptext {{
+    .tooltip:hover .tooltiptext {
         visibility: visible;
         opacity: 1;
+    }
+"""
+
+@st.cache_resource(max_entries=len(THEMES), show_spinner=False)
+def get_theme_css(theme_name):
+    """Build the custom CSS block for a theme, cached per theme name"""
+    # cache_resource hands back the shared string itself (safe, since strings are
+    # immutable) instead of unpickling a copy on every rerun like cache_data
+    theme = THEMES.get(theme_name, THEMES["light"])
+    
+    # Only the color variables depend on the theme
+    return f"""
+    <style>
+    :root {{
+        --theme-primary-color: {theme["primaryColor"]};
     }}
+    {CUSTOM_CSS}
     </style>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    """
+
+def display_custom_css():
+    """Display custom CSS based on the current theme"""
+    st.markdown(get_theme_css(get_current_theme()), unsafe_allow_html=True)
@@ -1,54 +1,156 @@
+import streamlit as st
 import pandas as pd
 import numpy as np
 
+def simple_moving_averages(close, windows=(20, 50, 200)):
+    """
+    Compute simple moving averages of a Close price Series for several windows
+    
+    Returns a list of NumPy arrays (one per window, NaN during warm-up)
+    """
+    values = close.to_numpy(dtype=float)
+    if np.isnan(values).any():
+        # A prefix sum would carry a missing price into every later window
+        return [close.rolling(window=window).mean().to_numpy() for window in windows]
+    
+    # One cumulative sum serves all windows: sum(i-w+1..i) = csum[i+1] - csum[i+1-w]
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    averages = []
+    for window in windows:
+        average = np.full(len(values), np.nan)
+        if len(values) >= window:
+            average[window - 1:] = (csum[window:] - csum[:-window]) / window
+        averages.append(average)
+    return averages
+
+# The indicator functions are cached on the price data and parameters, so reruns
+# with unchanged data skip the rolling-window calculations
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
 def calculate_moving_averages(data):
     """
     Calculate simple moving averages
     """
-    df = data.copy()
-    df['MA20'] = df['Close'].rolling(window=20).mean()
-    df['MA50'] = df['Close'].rolling(window=50).mean()
-    df['MA200'] = df['Close'].rolling(window=200).mean()
+    df = data.copy(deep=False)
+    df['MA20'], df['MA50'], df['MA200'] = simple_moving_averages(df['Close'])
     return df
 
-def calculate_rsi(data, window=14):
+def wilder_rsi(close, window=14):
     """
-    Calculate Relative Strength Index
+    Compute RSI values (Wilder's smoothing) for a Close price Series as a NumPy array
     """
-    df = data.copy()
-    delta = df['Close'].diff()
-    gain = delta.mask(delta < 0, 0)
-    loss = -delta.mask(delta > 0, 0)
+    close = close.to_numpy(dtype=float)
+    delta = np.diff(close, prepend=close[:1])
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
     
-    avg_gain = gain.rolling(window=window).mean()
-    avg_loss = loss.rolling(window=window).mean()
+    # Wilder's moving average is an EMA with alpha = 1 / window
+    avg_gain = pd.Series(gain).ewm(alpha=1 / window, adjust=False, min_periods=window).mean().to_numpy()
+    avg_loss = pd.Series(loss).ewm(alpha=1 / window, adjust=False, min_periods=window).mean().to_numpy()
     
-    rs = avg_gain / avg_loss
-    df['RSI'] = 100 - (100 / (1 + rs))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def calculate_rsi(data, window=14):
+    """
+    Calculate Relative Strength Index (Wilder's smoothing)
+    """
+    df = data.copy(deep=False)
+    df['RSI'] = wilder_rsi(df['Close'], window)
     
     return df
 
+def rolling_mean_std(close, window=20):
+    """
+    Compute the rolling mean and sample standard deviation of a Close price Series together
+    
+    Returns a tuple of NumPy arrays (NaN during warm-up)
+    """
+    values = close.to_numpy(dtype=float)
+    if np.isnan(values).any() or len(values) < window:
+        return close.rolling(window=window).mean().to_numpy(), close.rolling(window=window).std().to_numpy()
+    
+    # Window sums of x and x^2 from prefix sums; centering first keeps the variance precise
+    offset = values.mean()
+    centered = values - offset
+    csum = np.concatenate(([0.0], np.cumsum(centered)))
+    csum_sq = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    window_sum = csum[window:] - csum[:-window]
+    window_sum_sq = csum_sq[window:] - csum_sq[:-window]
+    
+    mean = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+    mean[window - 1:] = window_sum / window + offset
+    variance = (window_sum_sq - window_sum * window_sum / window) / (window - 1)
+    std[window - 1:] = np.sqrt(np.maximum(variance, 0.0))
+    return mean, std
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
 def calculate_bollinger_bands(data, window=20, num_std=2):
     """
     Calculate Bollinger Bands
     """
-    df = data.copy()
-    df['middle_band'] = df['Close'].rolling(window=window).mean()
-    df['std'] = df['Close'].rolling(window=window).std()
-    df['upper_band'] = df['middle_band'] + (df['std'] * num_std)
-    df['lower_band'] = df['middle_band'] - (df['std'] * num_std)
+    df = data.copy(deep=False)
+    middle_band, std = rolling_mean_std(df['Close'], window)
+    df['middle_band'] = middle_band
+    df['std'] = std
+    df['upper_band'] = middle_band + (std * num_std)
+    df['lower_band'] = middle_band - (std * num_std)
     
     return df
 
+def macd_lines(close, fast=12, slow=26, signal=9):
+    """
+    Compute the MACD lines for a Close price Series as NumPy arrays
+    
+    Returns a tuple of (fast EMA, slow EMA, MACD, signal, histogram)
+    """
+    ema_fast = close.ewm(span=fast, min_periods=fast).mean().to_numpy()
+    ema_slow = close.ewm(span=slow, min_periods=slow).mean().to_numpy()
+    macd = ema_fast - ema_slow
+    macd_signal = pd.Series(macd).ewm(span=signal, min_periods=signal).mean().to_numpy()
+    return ema_fast, ema_slow, macd, macd_signal, macd - macd_signal
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
 def calculate_macd(data, fast=12, slow=26, signal=9):
     """
     Calculate MACD (Moving Average Convergence Divergence)
     """
-    df = data.copy()
-    df['ema_fast'] = df['Close'].ewm(span=fast, min_periods=fast).mean()
-    df['ema_slow'] = df['Close'].ewm(span=slow, min_periods=slow).mean()
-    df['macd'] = df['ema_fast'] - df['ema_slow']
-    df['signal'] = df['macd'].ewm(span=signal, min_periods=signal).mean()
-    df['histogram'] = df['macd'] - df['signal']
+    df = data.copy(deep=False)
+    df['ema_fast'], df['ema_slow'], df['macd'], df['signal'], df['histogram'] = macd_lines(df['Close'], fast, slow, signal)
+    
+    return df
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def calculate_all_indicators(data, bb_window=20, num_std=2, rsi_window=14, fast=12, slow=26, signal=9):
+    """
+    Calculate moving averages, RSI, Bollinger Bands and MACD in a single pass
+    
+    Produces the same columns as the individual calculate_* functions with one copy of the data.
+    """
+    df = data.copy(deep=False)
+    close = df['Close']
+    
+    # Moving averages
+    ma20, ma50, ma200 = simple_moving_averages(close)
+    df['MA20'] = ma20
+    df['MA50'] = ma50
+    df['MA200'] = ma200
+    
+    # RSI
+    df['RSI'] = wilder_rsi(close, rsi_window)
+    
+    # Bollinger Bands (the middle band is the MA20 when using the default window)
+    middle_band, std = rolling_mean_std(close, bb_window)
+    if bb_window == 20:
+        middle_band = ma20
+    df['middle_band'] = middle_band
+    df['std'] = std
+    df['upper_band'] = middle_band + (std * num_std)
+    df['lower_band'] = middle_band - (std * num_std)
+    
+    # MACD
+    df['ema_fast'], df['ema_slow'], df['macd'], df['signal'], df['histogram'] = macd_lines(close, fast, slow, signal)
     
     return df